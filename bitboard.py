@@ -0,0 +1,94 @@
+# Compact board representation for the faster engines and tools.
+# A position is two integers, one bitmask per mark, where cell (row, col) is bit
+# row * size + col. Helpers convert to and from the list-of-lists boards the
+# minimax scripts use.
+
+from functools import lru_cache
+
+PLAYER, BOT = 'X', 'O'
+
+
+# Returns the bitmask of every winning line (rows, columns and both diagonals)
+@lru_cache(maxsize=None)
+def line_masks(size):
+    masks = []
+    for row in range(size):
+        masks.append(sum(1 << (row * size + col) for col in range(size)))
+    for col in range(size):
+        masks.append(sum(1 << (row * size + col) for row in range(size)))
+    masks.append(sum(1 << (i * size + i) for i in range(size)))
+    masks.append(sum(1 << (i * size + size - 1 - i) for i in range(size)))
+    return tuple(masks)
+
+
+# Returns, for every cell, the masks of the lines that pass through it
+@lru_cache(maxsize=None)
+def cell_lines(size):
+    return tuple(tuple(mask for mask in line_masks(size) if mask >> cell & 1) for cell in range(size * size))
+
+
+def full_mask(size):
+    return (1 << (size * size)) - 1
+
+
+# Converts a list-of-lists board to (x_bits, o_bits)
+def from_board(b, player=PLAYER, bot=BOT):
+    size = len(b)
+    x_bits = o_bits = 0
+    for row in range(size):
+        for col in range(size):
+            if b[row][col] == player:
+                x_bits |= 1 << (row * size + col)
+            elif b[row][col] == bot:
+                o_bits |= 1 << (row * size + col)
+    return x_bits, o_bits
+
+
+# Converts (x_bits, o_bits) back to a list-of-lists board
+def to_board(x_bits, o_bits, size, player=PLAYER, bot=BOT):
+    return [[player if x_bits >> (row * size + col) & 1 else bot if o_bits >> (row * size + col) & 1 else '_'
+             for col in range(size)] for row in range(size)]
+
+
+# Decodes a base-3 board code into (x_bits, o_bits)
+def from_code(code, size):
+    x_bits = o_bits = 0
+    for cell in range(size * size - 1, -1, -1):
+        code, digit = divmod(code, 3)
+        if digit == 1:
+            x_bits |= 1 << cell
+        elif digit == 2:
+            o_bits |= 1 << cell
+    return x_bits, o_bits
+
+
+# Returns True if the marks in bits complete any line
+def has_won(bits, size):
+    return any(bits & mask == mask for mask in line_masks(size))
+
+
+# Returns True if the mark just played at cell completes a line through it
+def wins_with(bits, cell, size):
+    return any(bits & mask == mask for mask in cell_lines(size)[cell])
+
+
+# Returns a bitmask of the cells where `own` would complete a line with its next move
+def winning_cells(own, other, size):
+    cells = 0
+    for mask in line_masks(size):
+        if not other & mask:
+            missing = mask & ~own
+            if missing and not missing & (missing - 1):
+                cells |= missing
+    return cells
+
+
+# Returns the indices of the empty cells
+def empty_cells(x_bits, o_bits, size):
+    taken = x_bits | o_bits
+    return [cell for cell in range(size * size) if not taken >> cell & 1]
+
+
+# Returns True if the PLAYER ('X', who moves first) is to move
+def player_to_move(x_bits, o_bits):
+    return x_bits.bit_count() == o_bits.bit_count()
@@ -0,0 +1,94 @@
+# Local load-testing client for server.py.
+# Opens many connections, asks for moves on random positions and reports throughput,
+# latency percentiles and the server's own statistics.
+#
+# Example: python client.py --clients 32 --requests 50 --grid 3 --time 0.1
+
+import argparse
+import asyncio
+import json
+import random
+import time
+
+from bitboard import from_board, has_won
+from tournament import quantile
+
+
+# Opens a connection and returns a function that sends one request and waits for its reply
+async def connect(host, port):
+    reader, writer = await asyncio.open_connection(host, port)
+
+    async def call(request):
+        writer.write(json.dumps(request).encode() + b'\n')
+        await writer.drain()
+        return json.loads(await reader.readline())
+
+    return call, writer
+
+
+# Asks the server for one move
+async def request_move(host, port, board, time_budget=1.0):
+    call, writer = await connect(host, port)
+    try:
+        return await call({'board': board, 'time': time_budget})
+    finally:
+        writer.close()
+
+
+# Returns a random undecided position after a few random moves, as a list of row strings
+def random_board(size, rng):
+    while True:
+        cells = ['_'] * (size * size)
+        order = list(range(size * size))
+        rng.shuffle(order)
+        for ply, cell in enumerate(order[:rng.randrange(size * size - 2)]):
+            cells[cell] = 'X' if ply % 2 == 0 else 'O'
+        rows = [''.join(cells[row * size:(row + 1) * size]) for row in range(size)]
+        x_bits, o_bits = from_board(rows)
+        if not (has_won(x_bits, size) or has_won(o_bits, size)):
+            return rows
+
+
+async def run_client(host, port, requests, size, time_budget, seed, latencies, errors):
+    rng = random.Random(seed)
+    call, writer = await connect(host, port)
+    try:
+        for index in range(requests):
+            start = time.perf_counter()
+            reply = await call({'id': index, 'board': random_board(size, rng), 'time': time_budget})
+            if 'error' in reply:
+                errors.append(reply['error'])
+            else:
+                latencies.append((time.perf_counter() - start) * 1000)
+    finally:
+        writer.close()
+
+
+async def run(args):
+    latencies, errors = [], []
+    start = time.perf_counter()
+    await asyncio.gather(*(run_client(args.host, args.port, args.requests, args.grid, args.time,
+                                      seed, latencies, errors) for seed in range(args.clients)))
+    elapsed = time.perf_counter() - start
+
+    print(f"{len(latencies)} moves in {elapsed:.2f}s ({len(latencies) / elapsed:.1f}/s), {len(errors)} errors")
+    print(f"client latency p50 {quantile(latencies, 0.5):.1f} ms, p99 {quantile(latencies, 0.99):.1f} ms")
+
+    call, writer = await connect(args.host, args.port)
+    print(f"server stats: {await call({'op': 'stats'})}")
+    writer.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test the move service")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--clients', type=int, default=16)
+    parser.add_argument('--requests', type=int, default=20, help="requests per client")
+    parser.add_argument('--grid', type=int, default=3)
+    parser.add_argument('--time', type=float, default=0.1, help="time budget per move in seconds")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
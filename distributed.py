@@ -0,0 +1,464 @@
+# Distributed minimax search over TCP.
+# A coordinator expands the top of the tree itself, to split_depth plies, and turns
+# every position it reaches there into a work unit. Workers connect over TCP, from
+# this host or others, and pull units one at a time; each searches its unit with
+# minimax() from minimax-full.py and sends back the value, the positions analyzed and
+# the table entries for the unit and its children. The coordinator keeps those entries
+# and passes them on to the other workers with their next units, so transpositions
+# found by one worker save the others a search. Once every unit has a value, the
+# coordinator backs them up the top of the tree to pick the move.
+#
+# Units are shared by work stealing. Each worker has its own queue of units on the
+# coordinator, holding neighbouring positions so its table stays warm. A worker whose
+# queue is empty takes the back half of the longest queue. Units left on a queue, or
+# being searched, when a worker disconnects go back to be taken by the others.
+#
+# Each unit is searched with the alpha-beta window its ancestors get from the units
+# already finished, as in a single search, so later units get narrower windows. Units
+# handed out together cannot narrow each other's windows, which costs some pruning.
+#
+# Local workers are separate processes that connect to the coordinator over TCP just
+# like remote ones, so the search is the same either way.
+#
+# Protocol, one line of JSON per message:
+#   -> {"op": "hello", "name": "host:pid"}
+#   -> {"op": "get"}
+#   <- {"op": "unit", "id": 3, "board": ["O__", "_X_", "___"], "depth": 1, "is_max": false,
+#       "alpha": -1000, "beta": 0, "max_depth": 9,
+#       "entries": [[key, bound, remaining depth, value, move], ...]}
+#   -> {"op": "result", "id": 3, "value": 0, "nodes": 1234, "entries": [...]}
+#   <- {"op": "done"}  (in reply to "get" once the search is finished)
+#
+# Example: python distributed.py search --grid 4 --depth 7 --workers 4
+#          python distributed.py search --grid 5 --depth 6 --workers 0 --host 0.0.0.0 --port 8766
+#          python distributed.py worker --host 192.168.1.20 --port 8766   (on each other host)
+
+import argparse
+import asyncio
+import collections
+import json
+import multiprocessing
+import os
+import socket
+import time
+
+from bitboard import from_board, player_to_move
+from pnsearch import board_from_moves
+from ttable import EXACT
+from variants import flip_marks, load_variant
+
+INFINITY = 1000
+
+# Seconds a local worker keeps trying to reach the coordinator
+CONNECT_RETRY = 10.0
+
+DistributedResult = collections.namedtuple('DistributedResult',
+                                           'value move nodes seconds units steals workers table')
+
+
+# A position in the top of the tree: a work unit, or the moves searched from it with
+# the node each leads to. pending counts the unfinished units below it; once it is 0,
+# value holds the node's value.
+class SplitNode:
+    __slots__ = ('parent', 'is_max', 'value', 'unit', 'children', 'pending')
+
+    def __init__(self, parent, is_max, value=None):
+        self.parent = parent
+        self.is_max = is_max
+        self.value = value
+        self.unit = None
+        self.children = None
+        self.pending = 0
+
+    # Sets the value from the children's, once they all have one
+    def back_up(self):
+        values = [child.value for _, child in self.children]
+        self.value = max(values) if self.is_max else min(values)
+
+
+# A worker as seen by the coordinator
+class Peer:
+    def __init__(self, name):
+        self.name = name
+        self.queue = collections.deque()
+        self.unit = None  # Unit being searched
+        self.cursor = 0  # Shared table entries already sent
+
+
+# Returns the table entry with the deeper search, preferring exact values on a tie
+def better_entry(old, new):
+    if old is None or new[1] > old[1] or (new[1] == old[1] and new[0] == EXACT):
+        return new
+    return old
+
+
+class Coordinator:
+    def __init__(self, b, max_depth, split_depth=2):
+        self.engine = load_variant('full', instance=('distributed', len(b)))
+        if self.engine.GRID_SIZE != len(b):
+            self.engine.set_grid_size(len(b))
+        self.max_depth = max_depth
+        self.split_depth = split_depth
+        self.units = []
+        self.unit_keys = {}
+        self.unit_nodes = []
+        self.values = {}
+        self.nodes = 0
+        self.steals = 0
+        self.table = {}
+        self.shared = []
+        self.peers = []
+        self.connections = set()
+        self.searched = collections.Counter()  # Units searched, by worker name
+        self.unclaimed = collections.deque()
+        self.changed = None
+        self.finished = None
+        self.root = self.split(b)
+        self.unclaimed.extend(range(len(self.units)))
+
+    # Expands the root for the BOT. Like find_best_move_with_depth_limit(), an immediate
+    # win or the block of a single threat is the only move searched.
+    def split(self, b):
+        engine = self.engine
+        moves = sorted(engine.winning_cells(b, engine.BOT))[:1]
+        threats = engine.winning_cells(b, engine.PLAYER)
+        if not moves:
+            moves = list(threats) if len(threats) == 1 else engine.ordered_moves(b)
+        root = SplitNode(None, True)
+        self.expand_moves(root, b, moves, 0)
+        return root
+
+    # Makes each move in turn and splits the position it leads to
+    def expand_moves(self, node, b, moves, depth):
+        mark = self.engine.BOT if node.is_max else self.engine.PLAYER
+        node.children = []
+        for i, j in moves:
+            b[i][j] = mark
+            self.nodes += 1
+            child = self.split_node(node, b, depth, not node.is_max)
+            node.children.append(((i, j), child))
+            node.pending += child.pending
+            b[i][j] = '_'
+        if not node.pending and node.children:
+            node.back_up()
+
+    # Splits a position reached at `depth`, applying minimax()'s checks before its moves,
+    # so the values backed up here are the ones a single search would find
+    def split_node(self, parent, b, depth, is_max):
+        engine = self.engine
+        score = engine.evaluate(b)
+        if score == 10:
+            return SplitNode(parent, is_max, score - depth)
+        if score == -10:
+            return SplitNode(parent, is_max, score + depth)
+        if depth == self.max_depth:
+            return SplitNode(parent, is_max, score)
+        live_counts = engine.live_line_counts(b) if engine.remaining_moves(b) else None
+        if live_counts is None:
+            return SplitNode(parent, is_max, 0)
+
+        mark, opponent = (engine.BOT, engine.PLAYER) if is_max else (engine.PLAYER, engine.BOT)
+        if engine.winning_cells(b, mark):
+            return SplitNode(parent, is_max, 10 - (depth + 1) if is_max else -10 + (depth + 1))
+        threats = engine.winning_cells(b, opponent)
+        if len(threats) > 1:
+            return SplitNode(parent, is_max, -10 + (depth + 2) if is_max else 10 - (depth + 2))
+
+        node = SplitNode(parent, is_max)
+
+        # Positions deep enough become units; one reached twice is searched once
+        if depth >= self.split_depth - 1:
+            key = engine.board_code(b)
+            if key not in self.unit_keys:
+                self.unit_keys[key] = len(self.units)
+                self.units.append({'board': [''.join(row) for row in b], 'depth': depth, 'is_max': is_max})
+                self.unit_nodes.append([])
+            node.unit = self.unit_keys[key]
+            node.pending = 1
+            self.unit_nodes[node.unit].append(node)
+            return node
+
+        moves = list(threats) if threats else engine.search_moves(b, None, live_counts)
+        self.expand_moves(node, b, moves, depth + 1)
+        return node
+
+    # Returns the window a node would be searched with: each ancestor bounds it by the
+    # best value among its finished children. As in search_root(), root moves are kept
+    # exact down to the best value so far, so a move tying it is never mistaken for it.
+    @staticmethod
+    def node_window(node):
+        alpha, beta = -INFINITY, INFINITY
+        while node.parent is not None:
+            parent = node.parent
+            done = [child.value for _, child in parent.children if child is not node and not child.pending]
+            if done and parent.is_max:
+                alpha = max(alpha, max(done) - (1 if parent.parent is None else 0))
+            elif done:
+                beta = min(beta, min(done))
+            node = parent
+        return alpha, beta
+
+    # Returns the window for a unit, wide enough for every node it stands for
+    def unit_window(self, unit):
+        windows = [self.node_window(node) for node in self.unit_nodes[unit]]
+        return min(alpha for alpha, _ in windows), max(beta for _, beta in windows)
+
+    # Returns the next unit for a peer: the front of its own queue, or else the back
+    # half of the longest queue, unclaimed units included
+    def take(self, peer):
+        if not peer.queue:
+            victim = max([self.unclaimed] + [other.queue for other in self.peers], key=len)
+            if not victim:
+                return None
+            stolen = [victim.pop() for _ in range((len(victim) + 1) // 2)]
+            peer.queue.extend(reversed(stolen))
+            if victim is not self.unclaimed:
+                self.steals += 1
+        return peer.queue.popleft()
+
+    # Waits for a unit for the peer; returns None once the search is finished
+    async def next_unit(self, peer):
+        async with self.changed:
+            while len(self.values) < len(self.units):
+                unit = self.take(peer)
+                if unit is not None:
+                    peer.unit = unit
+                    return unit
+                await self.changed.wait()
+            return None
+
+    def unit_message(self, unit, peer):
+        entries = self.shared[peer.cursor:]
+        peer.cursor = len(self.shared)
+        alpha, beta = self.unit_window(unit)
+        return dict(self.units[unit], op='unit', id=unit, alpha=alpha, beta=beta, max_depth=self.max_depth,
+                    entries=entries)
+
+    async def record(self, peer, message):
+        unit = message['id']
+        peer.unit = None
+        if unit in self.values:
+            return
+        self.values[unit] = message['value']
+        self.nodes += message['nodes']
+        self.searched[peer.name] += 1
+        for node in self.unit_nodes[unit]:
+            node.value = message['value']
+            node.pending = 0
+            parent = node.parent
+            while parent is not None:
+                parent.pending -= 1
+                if not parent.pending:
+                    parent.back_up()
+                parent = parent.parent
+        for key, *entry in message['entries']:
+            entry = tuple(entry)
+            if better_entry(self.table.get(key), entry) is entry:
+                self.table[key] = entry
+                self.shared.append([key, *entry])
+        if len(self.values) == len(self.units):
+            self.finished.set()
+            async with self.changed:
+                self.changed.notify_all()
+
+    # Hands a departed peer's units back to the others
+    async def release(self, peer):
+        self.peers.remove(peer)
+        if peer.unit is not None and peer.unit not in self.values:
+            peer.queue.appendleft(peer.unit)
+        self.unclaimed.extendleft(reversed(peer.queue))
+        peer.queue.clear()
+        async with self.changed:
+            self.changed.notify_all()
+
+    async def handle_connection(self, reader, writer):
+        peer = Peer(str(writer.get_extra_info('peername')))
+        self.peers.append(peer)
+        self.connections.add(asyncio.current_task())
+        try:
+            while line := await reader.readline():
+                message = json.loads(line)
+                if message['op'] == 'hello':
+                    peer.name = message['name']
+                elif message['op'] == 'result':
+                    await self.record(peer, message)
+                elif message['op'] == 'get':
+                    unit = await self.next_unit(peer)
+                    reply = {'op': 'done'} if unit is None else self.unit_message(unit, peer)
+                    writer.write(json.dumps(reply).encode() + b'\n')
+                    await writer.drain()
+        except (ConnectionError, ValueError, KeyError):
+            pass
+        finally:
+            self.connections.discard(asyncio.current_task())
+            await self.release(peer)
+            writer.close()
+
+    # Serves units until every one has a value, starting `local_workers` worker
+    # processes on this host; others may connect from anywhere. Returns the result.
+    async def run(self, host='127.0.0.1', port=0, local_workers=0, verbose=False):
+        start = time.perf_counter()
+        self.changed = asyncio.Condition()
+        self.finished = asyncio.Event()
+        processes = []
+
+        if len(self.values) < len(self.units):
+            server = await asyncio.start_server(self.handle_connection, host, port)
+            port = server.sockets[0].getsockname()[1]
+            if verbose:
+                print(f"Coordinating {len(self.units)} units on {host}:{port}")
+            local_host = '127.0.0.1' if host in ('', '0.0.0.0') else host
+            for _ in range(local_workers):
+                process = multiprocessing.Process(target=run_worker, args=(local_host, port, CONNECT_RETRY))
+                process.start()
+                processes.append(process)
+            try:
+                async with server:
+                    await self.finished.wait()
+
+                    # Let the workers take their "done" and hang up
+                    if self.connections:
+                        await asyncio.wait(self.connections, timeout=CONNECT_RETRY)
+            finally:
+                loop = asyncio.get_running_loop()
+                await asyncio.gather(*(loop.run_in_executor(None, process.join, CONNECT_RETRY)
+                                       for process in processes))
+                for process in processes:
+                    if process.is_alive():
+                        process.terminate()
+
+        scored = [(child.value, move) for move, child in self.root.children]
+        value, move = max(scored, key=lambda item: item[0]) if scored else (0, (-1, -1))
+        return DistributedResult(value, move, self.nodes, time.perf_counter() - start, len(self.units),
+                                 self.steals, dict(self.searched), self.table)
+
+
+# Returns the best move for the side to move and its score from that side's point of
+# view, searching max_depth plies with workers connected over TCP. local_workers
+# processes are started on this host; with host and port set to a reachable address,
+# workers on other hosts can join the same search with `distributed.py worker`.
+def search(b, max_depth, local_workers=None, split_depth=2, host='127.0.0.1', port=0, verbose=False):
+    engine = load_variant('full')
+    if player_to_move(*from_board(b)):
+        b = flip_marks(b, engine)
+    coordinator = Coordinator([row[:] for row in b], max_depth, split_depth)
+    if local_workers is None:
+        local_workers = os.cpu_count()
+    return asyncio.run(coordinator.run(host, port, local_workers, verbose))
+
+
+# Returns the worker's table entries for a unit and the positions one move after it
+def unit_entries(engine, b, is_max):
+    key = engine.board_code(b)
+    digit = engine.CELL_CODES[engine.BOT if is_max else engine.PLAYER]
+    keys = [key] + [key + digit * engine.CELL_PLACES[i * engine.GRID_SIZE + j]
+                    for i in range(engine.GRID_SIZE) for j in range(engine.GRID_SIZE) if b[i][j] == '_']
+    entries = []
+    for key in keys:
+        entry = engine.transposition_table.get(key)
+        if entry is not None:
+            entries.append([key, *entry])
+    return entries
+
+
+# Connects to a coordinator and searches units until it says the search is done,
+# retrying the connection for up to `retry` seconds. Returns the units searched.
+def run_worker(host, port, retry=0.0):
+    engine = load_variant('full')
+    deadline = time.monotonic() + retry
+    while True:
+        try:
+            connection = socket.create_connection((host, port))
+            break
+        except OSError:
+            if time.monotonic() >= deadline:
+                raise
+            time.sleep(0.2)
+
+    # Results and requests are small messages, which should not wait to be coalesced
+    connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    units = 0
+    with connection, connection.makefile('rwb') as stream:
+        def send(message):
+            stream.write(json.dumps(message).encode() + b'\n')
+            stream.flush()
+
+        send({'op': 'hello', 'name': f"{socket.gethostname()}:{os.getpid()}"})
+        while True:
+            send({'op': 'get'})
+            line = stream.readline()
+            if not line:
+                break
+            unit = json.loads(line)
+            if unit['op'] == 'done':
+                break
+
+            b = [list(row) for row in unit['board']]
+            if engine.GRID_SIZE != len(b):
+                engine.set_grid_size(len(b))
+            table = engine.transposition_table
+            for key, *entry in unit['entries']:
+                entry = tuple(entry)
+                if better_entry(table.get(key), entry) is entry:
+                    table[key] = entry
+
+            engine.analysis_count = 0
+            minimax = engine.minimax_iterative if engine.ITERATIVE_SEARCH else engine.minimax
+            value = minimax(b, unit['depth'], unit['is_max'], unit['alpha'], unit['beta'], unit['max_depth'])
+            send({'op': 'result', 'id': unit['id'], 'value': value, 'nodes': engine.analysis_count,
+                  'entries': unit_entries(engine, b, unit['is_max'])})
+            units += 1
+    return units
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Search across processes and hosts over TCP")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    coordinate = commands.add_parser('search', help="coordinate a search, with local workers")
+    coordinate.add_argument('--grid', type=int, default=4)
+    coordinate.add_argument('--moves', default='', help='moves played so far, e.g. "1,1 0,2"')
+    coordinate.add_argument('--depth', type=int, default=7)
+    coordinate.add_argument('--workers', type=int, default=None, help="local worker processes (default: one per core)")
+    coordinate.add_argument('--split-depth', type=int, default=2, help="plies expanded before splitting into units")
+    coordinate.add_argument('--host', default='127.0.0.1')
+    coordinate.add_argument('--port', type=int, default=0, help="port to listen on (default: any free port)")
+    coordinate.add_argument('--check', action='store_true', help="compare with a single-process search")
+
+    work = commands.add_parser('worker', help="search units for a coordinator")
+    work.add_argument('--host', default='127.0.0.1')
+    work.add_argument('--port', type=int, required=True)
+    work.add_argument('--retry', type=float, default=60.0, help="seconds to keep trying to connect")
+    args = parser.parse_args()
+
+    if args.command == 'worker':
+        units = run_worker(args.host, args.port, args.retry)
+        print(f"Searched {units} units")
+        return
+
+    engine = load_variant('full')
+    if engine.GRID_SIZE != args.grid:
+        engine.set_grid_size(args.grid)
+    b = board_from_moves(args.moves, engine)
+
+    result = search(b, args.depth, args.workers, args.split_depth, args.host, args.port, verbose=True)
+    print(f"Move {result.move}  value {result.value}  {result.nodes} positions  {result.seconds:.2f}s  "
+          f"{result.units} units  {result.steals} steals  {len(result.table)} table entries returned")
+    for name, units in sorted(result.workers.items()):
+        print(f"  {name:24} {units:5} units")
+
+    if args.check:
+        if player_to_move(*from_board(b)):
+            b = flip_marks(b, engine)
+        engine.transposition_table.clear()
+        engine.analysis_count = 0
+        start = time.perf_counter()
+        value, _ = engine.search_root(b, args.depth, -float('inf'), float('inf'))
+        print(f"Single process: value {value}  {engine.analysis_count} positions  "
+              f"{time.perf_counter() - start:.2f}s")
+        if value != result.value:
+            raise SystemExit("MISMATCH: the distributed search found a different value")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+# Compact game record log.
+# Finished games are appended to a binary file so the positions users actually reach
+# can be replayed against new engine builds (see replay.py). Each record is a header
+# followed by one entry per move:
+#
+#   header: magic b'G2', grid size, number of moves, result (1 X won, 2 O won, 0 draw),
+#           unix time, length of the engine name, then the name in ASCII
+#   move:   cell index (row * size + col), mark (1 X, 2 O, plus 128 if an engine chose
+#           the move), search time in microseconds and positions analyzed
+#
+# Logs written before the engine flag (magic b'G1') are still read; their moves count
+# as engine moves when they logged any search time or positions.
+
+import struct
+import time
+
+HEADER = struct.Struct('<2sBHBdB')
+MOVE = struct.Struct('<BBII')
+MAGIC = b'G2'
+OLD_MAGIC = b'G1'
+ENGINE_MOVE = 128
+
+MARKS = {'X': 1, 'O': 2}
+MARK_NAMES = {1: 'X', 2: 'O', 0: None}
+
+
+# Appends one game. moves is a list of (row, col, mark, seconds, nodes, by_engine);
+# winner is 'X', 'O' or None for a draw.
+def append_game(path, grid_size, moves, winner, engine=''):
+    name = engine.encode('ascii')[:255]
+    record = bytearray(HEADER.pack(MAGIC, grid_size, len(moves), MARKS.get(winner, 0), time.time(), len(name)))
+    record += name
+    for row, col, mark, seconds, nodes, by_engine in moves:
+        record += MOVE.pack(row * grid_size + col, MARKS[mark] | (ENGINE_MOVE if by_engine else 0),
+                            min(int(seconds * 1e6), 0xFFFFFFFF), min(nodes, 0xFFFFFFFF))
+    with open(path, 'ab') as f:
+        f.write(record)
+
+
+# Yields every game in a log as a dict with grid_size, winner, time, engine and moves,
+# where moves are (row, col, mark, seconds, nodes, by_engine) like append_game() takes
+def read_games(path):
+    with open(path, 'rb') as f:
+        while header := f.read(HEADER.size):
+            if len(header) < HEADER.size:
+                break
+            magic, grid_size, count, winner, timestamp, name_length = HEADER.unpack(header)
+            if magic not in (MAGIC, OLD_MAGIC):
+                raise ValueError(f"{path}: corrupt game record at byte {f.tell() - HEADER.size}")
+            engine = f.read(name_length).decode('ascii')
+            moves = []
+            for _ in range(count):
+                cell, mark, micros, nodes = MOVE.unpack(f.read(MOVE.size))
+                row, col = divmod(cell, grid_size)
+                by_engine = bool(mark & ENGINE_MOVE) if magic == MAGIC else bool(micros or nodes)
+                moves.append((row, col, MARK_NAMES[mark & ~ENGINE_MOVE], micros / 1e6, nodes, by_engine))
+            yield {'grid_size': grid_size, 'winner': MARK_NAMES[winner], 'time': timestamp,
+                   'engine': engine, 'moves': moves}
@@ -0,0 +1,269 @@
+# Monte Carlo tree search (UCT) engine for large grids.
+# Full-width minimax only reaches a few plies on 5x5 and up, so this engine instead
+# plays fast random (or lightly heuristic) games on the compact board and grows a
+# search tree towards the moves that win most often. It is time-bounded, keeps its
+# tree between moves, and can run several searches in parallel processes whose root
+# statistics are merged.
+#
+# Example: python mcts.py --grid 6 --seconds 2 --workers 4
+
+import argparse
+import math
+import multiprocessing
+import random
+import time
+
+from bitboard import (empty_cells, from_board, full_mask, player_to_move, winning_cells,
+                      wins_with)
+
+EXPLORATION = 1.4
+
+# Playouts run by the last search, reported like minimax's analysis_count
+analysis_count = 0
+
+
+class Node:
+    __slots__ = ('x', 'o', 'move', 'parent', 'children', 'untried', 'visits', 'wins', 'mover_is_x', 'result')
+
+    def __init__(self, x, o, move, parent, result, rng, size):
+        self.x = x
+        self.o = o
+        self.move = move
+        self.parent = parent
+        self.children = []
+        self.visits = 0
+        self.wins = 0.0  # for the side that played `move`
+        self.mover_is_x = not player_to_move(x, o)
+
+        # result is 1 if X has won, -1 if O has won, 0 for a draw, or None if the game goes on
+        self.result = result
+        self.untried = [] if result is not None else empty_cells(x, o, size)
+        rng.shuffle(self.untried)
+
+
+# A single UCT search tree
+class MCTS:
+    def __init__(self, size, seed=None, heuristic=True, exploration=EXPLORATION):
+        self.size = size
+        self.full = full_mask(size)
+        self.rng = random.Random(seed)
+        self.heuristic = heuristic
+        self.exploration = exploration
+        self.root = None
+
+    # Moves the root to the given position, keeping the subtree if it is already in the tree
+    # (the position after our last move, or after the opponent's reply to it)
+    def set_position(self, x, o):
+        if self.root is not None:
+            for node in [self.root] + self.root.children + [g for c in self.root.children for g in c.children]:
+                if node.x == x and node.o == o:
+                    node.parent = None
+                    self.root = node
+                    return
+        self.root = Node(x, o, None, None, None, self.rng, self.size)
+
+    # Runs playouts until the time budget (or iteration count) is used up, returns the playout count
+    def search(self, seconds=None, iterations=None):
+        deadline = time.perf_counter() + seconds if seconds is not None else None
+        count = 0
+        while True:
+            # Every root move gets a playout first, however small the budget, so there is a move to pick
+            if not self.root.untried:
+                if iterations is not None and count >= iterations:
+                    break
+                if deadline is not None and count & 15 == 0 and time.perf_counter() > deadline:
+                    break
+            self._iterate()
+            count += 1
+        return count
+
+    def _iterate(self):
+        node = self.root
+        log = math.log
+        sqrt = math.sqrt
+        c = self.exploration
+
+        # Selection: follow UCT through fully expanded nodes
+        while not node.untried and node.children:
+            log_n = log(node.visits)
+            node = max(node.children, key=lambda child: child.wins / child.visits + c * sqrt(log_n / child.visits))
+
+        # Expansion: add one untried move
+        if node.untried:
+            cell = node.untried.pop()
+            bit = 1 << cell
+            if node.mover_is_x:
+                x, o = node.x, node.o | bit
+                result = -1 if wins_with(o, cell, self.size) else None
+            else:
+                x, o = node.x | bit, node.o
+                result = 1 if wins_with(x, cell, self.size) else None
+            if result is None and x | o == self.full:
+                result = 0
+            child = Node(x, o, cell, node, result, self.rng, self.size)
+            node.children.append(child)
+            node = child
+
+        # Simulation
+        result = node.result if node.result is not None else self._playout(node.x, node.o)
+
+        # Backpropagation
+        while node is not None:
+            node.visits += 1
+            if result == 0:
+                node.wins += 0.5
+            elif (result == 1) == node.mover_is_x:
+                node.wins += 1
+            node = node.parent
+
+    # Plays random moves to the end of the game and returns 1, -1 or 0.
+    # With heuristic playouts, a side always takes an immediate win or blocks one.
+    def _playout(self, x, o):
+        size = self.size
+        rng = self.rng
+        empties = empty_cells(x, o, size)
+        x_to_move = player_to_move(x, o)
+
+        while empties:
+            own, other = (x, o) if x_to_move else (o, x)
+            cell = None
+            if self.heuristic:
+                free = ~(x | o)
+                if winning_cells(own, other, size) & free:
+                    return 1 if x_to_move else -1
+                block = winning_cells(other, own, size) & free
+                if block:
+                    cell = (block & -block).bit_length() - 1
+                    empties.remove(cell)
+            if cell is None:
+                index = rng.randrange(len(empties))
+                cell = empties[index]
+                empties[index] = empties[-1]
+                empties.pop()
+
+            own |= 1 << cell
+            if wins_with(own, cell, size):
+                return 1 if x_to_move else -1
+            if x_to_move:
+                x = own
+            else:
+                o = own
+            x_to_move = not x_to_move
+        return 0
+
+    # Returns {cell: (visits, wins)} for the root's children
+    def root_stats(self):
+        return {child.move: (child.visits, child.wins) for child in self.root.children}
+
+
+# Picks the most visited move from (merged) root statistics
+def most_visited(stats):
+    return max(stats, key=lambda cell: (stats[cell][0], stats[cell][1]))
+
+
+def _worker(conn, size, seed, heuristic):
+    tree = MCTS(size, seed, heuristic)
+    while True:
+        message = conn.recv()
+        if message is None:
+            break
+        x, o, seconds = message
+        tree.set_position(x, o)
+        playouts = tree.search(seconds)
+        conn.send((tree.root_stats(), playouts))
+    conn.close()
+
+
+# Root-parallel MCTS: each worker process grows (and keeps) its own tree from the
+# same position, and the root statistics are summed to pick the move
+class ParallelMCTS:
+    def __init__(self, size, workers, seed=None, heuristic=True):
+        self.size = size
+        self.connections = []
+        self.processes = []
+        base = seed if seed is not None else random.randrange(2 ** 32)
+        for k in range(workers):
+            parent, child = multiprocessing.Pipe()
+            process = multiprocessing.Process(target=_worker, args=(child, size, base + k, heuristic), daemon=True)
+            process.start()
+            self.connections.append(parent)
+            self.processes.append(process)
+
+    # Returns (merged root statistics, total playouts)
+    def search(self, x, o, seconds):
+        for conn in self.connections:
+            conn.send((x, o, seconds))
+        merged, playouts = {}, 0
+        for conn in self.connections:
+            stats, count = conn.recv()
+            playouts += count
+            for cell, (visits, wins) in stats.items():
+                total = merged.get(cell, (0, 0.0))
+                merged[cell] = (total[0] + visits, total[1] + wins)
+        return merged, playouts
+
+    def close(self):
+        for conn in self.connections:
+            conn.send(None)
+        for process in self.processes:
+            process.join()
+
+
+# Searchers are kept per board size and worker count, so trees are reused between moves
+_searchers = {}
+
+
+# Seeds the single-process searchers' playouts
+def seed_random(seed):
+    for searcher in _searchers.values():
+        if isinstance(searcher, MCTS):
+            searcher.rng.seed(seed)
+
+
+# Returns the best move as (row, col) for whichever side is to move on a list-of-lists
+# board, searching for time_budget seconds
+def find_best_move(b, time_budget=1.0, workers=1, seed=None):
+    global analysis_count
+    size = len(b)
+    x, o = from_board(b)
+
+    key = (size, workers)
+    if key not in _searchers:
+        _searchers[key] = MCTS(size, seed) if workers == 1 else ParallelMCTS(size, workers, seed)
+    searcher = _searchers[key]
+
+    if workers == 1:
+        searcher.set_position(x, o)
+        analysis_count = searcher.search(time_budget)
+        stats = searcher.root_stats()
+    else:
+        stats, analysis_count = searcher.search(x, o, time_budget)
+
+    # Always take an immediate win, even if the search has not found it yet
+    own, other = (x, o) if player_to_move(x, o) else (o, x)
+    wins = winning_cells(own, other, size) & ~(x | o)
+    cell = (wins & -wins).bit_length() - 1 if wins else most_visited(stats)
+    return divmod(cell, size)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pick a move for an empty board with MCTS and show root statistics")
+    parser.add_argument('--grid', type=int, default=6)
+    parser.add_argument('--seconds', type=float, default=1.0)
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args()
+
+    b = [['_'] * args.grid for _ in range(args.grid)]
+    start = time.perf_counter()
+    move = find_best_move(b, args.seconds, args.workers, args.seed)
+    elapsed = time.perf_counter() - start
+    print(f"Best move: {move}, {analysis_count} playouts in {elapsed:.2f}s ({analysis_count / elapsed:.0f}/s)")
+
+    for searcher in _searchers.values():
+        if isinstance(searcher, ParallelMCTS):
+            searcher.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -13,9 +13,6 @@
 import pygame
 import sys
 
-# Initialize Pygame
-pygame.init()
-
 # Constants
 PLAYER, BOT = 'X', 'O'
 WIDTH, HEIGHT = 600, 600
@@ -26,9 +23,8 @@ CELL_SIZE = WIDTH // GRID_SIZE
 WHITE = (255, 255, 255)
 BLACK = (0, 0, 0)
 
-# Pygame window setup
-screen = pygame.display.set_mode((WIDTH, HEIGHT))
-pygame.display.set_caption("Tic Tac Toe")
+# Pygame window, created by main() so the engine can be imported headless
+screen = None
 
 def draw_grid():
     for i in range(1, GRID_SIZE):
@@ -203,6 +199,12 @@ def find_best_move(b):
     return best_move
 
 def main():
+    # Initialize Pygame and set up the window
+    global screen
+    pygame.init()
+    screen = pygame.display.set_mode((WIDTH, HEIGHT))
+    pygame.display.set_caption("Tic Tac Toe")
+
     # Initialize gamestate and other variables
     player_turn = True  # True if it's the player's turn, False if it's the BOT's turn
     board = [['_' for _ in range(GRID_SIZE)] for _ in range(GRID_SIZE)]
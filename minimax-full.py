@@ -1,6 +1,7 @@
 # This is the final version of my tic-tac-toe algorithm for now.
 # Minimax, a/b pruning, and transposition tables all seem to be working properly.
 # This iteration also incorporates some slight randomness, to keep the bot from playing the same thing every time.
+# The randomness only applies to the choice between (nearly) equal root moves, so the search stays deterministic.
 
 # DEFAULT MINIMAX SEARCH
 # First move: Plays at 0, 0, 549936 positions
@@ -23,9 +24,12 @@
 import pygame
 import sys
 import random
+import time
 
-# Initialize Pygame
-pygame.init()
+import mcts
+from gamelog import append_game
+from tablebase import Tablebase
+from ttable import EXACT, LOWER, UPPER, CompactTable, open_mapped_table, value_from_table, value_to_table
 
 # Constants
 PLAYER, BOT = 'X', 'O'
@@ -36,10 +40,24 @@ CELL_SIZE = WIDTH // GRID_SIZE
 # Colors
 WHITE = (255, 255, 255)
 BLACK = (0, 0, 0)
+WIN_COLOR = (40, 160, 60)
+LOSS_COLOR = (170, 40, 40)
+DRAW_COLOR = (70, 70, 70)
 
-# Pygame window setup
-screen = pygame.display.set_mode((WIDTH, HEIGHT))
-pygame.display.set_caption("Tic Tac Toe")
+# Changes the board size, e.g. for headless tools. Cached positions belong to the old
+# size, so the transposition table is cleared.
+def set_grid_size(size):
+    global GRID_SIZE, CELL_SIZE, last_score
+    GRID_SIZE = size
+    CELL_SIZE = WIDTH // GRID_SIZE
+    WIN_LINES[:] = build_win_lines(GRID_SIZE)
+    CELL_LINES[:] = build_cell_lines(WIN_LINES, GRID_SIZE)
+    CELL_PLACES[:] = build_cell_places(GRID_SIZE)
+    transposition_table.clear()
+    last_score = None
+
+# Pygame window, created by main() so the engine can be imported headless
+screen = None
 
 # Displays the empty game grid
 def draw_grid():
@@ -63,6 +81,20 @@ def draw_board(board):
             text_rect = text.get_rect(center=(j * CELL_SIZE + CELL_SIZE // 2, i * CELL_SIZE + CELL_SIZE // 2))
             screen.blit(text, text_rect.topleft)
 
+# Shades each empty cell by its analysis score for the side to move (see analyze())
+# Wins are green and losses red, brighter the sooner they happen
+def draw_heatmap(analysis):
+    font = pygame.font.Font(None, 60)
+    for score, (i, j), line in analysis:
+        color = WIN_COLOR if score > 0 else LOSS_COLOR if score < 0 else DRAW_COLOR
+        if score != 0:
+            shade = 0.4 + 0.6 * abs(score) / 10
+            color = tuple(int(c * shade) for c in color)
+        pygame.draw.rect(screen, color, (j * CELL_SIZE, i * CELL_SIZE, CELL_SIZE, CELL_SIZE))
+        text = font.render(str(score), True, WHITE)
+        text_rect = text.get_rect(center=(j * CELL_SIZE + CELL_SIZE // 2, i * CELL_SIZE + CELL_SIZE // 2))
+        screen.blit(text, text_rect.topleft)
+
 # Returns True if playable moves remain
 def remaining_moves(b):
     for i in range(GRID_SIZE):
@@ -101,101 +133,606 @@ def evaluate(b):
     # If no winning sequence is detected, return 0
     return 0
 
+# Returns every winning line (rows, columns and both diagonals) as a list of cells
+def build_win_lines(size):
+    lines = [[(row, col) for col in range(size)] for row in range(size)]
+    lines += [[(row, col) for row in range(size)] for col in range(size)]
+    lines.append([(i, i) for i in range(size)])
+    lines.append([(i, size - 1 - i) for i in range(size)])
+    return lines
+
+WIN_LINES = build_win_lines(GRID_SIZE)
+
+# The winning lines through each cell (indexed row * GRID_SIZE + col)
+def build_cell_lines(lines, size):
+    return [[line for line in lines if (row, col) in line] for row in range(size) for col in range(size)]
+
+CELL_LINES = build_cell_lines(WIN_LINES, GRID_SIZE)
+
+# Returns the cells where `mark` would complete a line with its next move
+def winning_cells(b, mark):
+    cells = set()
+    for line in WIN_LINES:
+        empty = None
+        for row, col in line:
+            cell = b[row][col]
+            if cell == '_':
+                if empty is not None:
+                    break
+                empty = (row, col)
+            elif cell != mark:
+                break
+        else:
+            if empty is not None:
+                cells.add(empty)
+    return cells
+
 # Transposition table to store computed minimax values
+# Entries are (bound, depth, value, move) tuples keyed by board_code(b), where depth is
+# the remaining search depth and move is the index of the best cell (or None)
 transposition_table = {}
 
+# Set TABLE_PATH to a file name to keep the transposition table on disk between runs,
+# or COMPACT_TABLE to pack the in-memory table into arrays (about 10x more positions
+# fit in the same memory as the dict)
+TABLE_PATH = None
+COMPACT_TABLE = False
+TABLE_SLOTS = 1 << 20
+
+# Replaces the dict with a fixed-size array-backed table
+def use_compact_table(slots=TABLE_SLOTS):
+    global transposition_table
+    transposition_table = CompactTable(slots)
+    return transposition_table
+
+# Replaces the in-memory table with a memory-mapped one stored at path
+def open_persistent_table(path, slots=TABLE_SLOTS):
+    global transposition_table
+    transposition_table = open_mapped_table(path, GRID_SIZE, slots)
+    return transposition_table
+
+# Encodes the board as a base-3 integer, used as the transposition table key
+CELL_CODES = {'_': 0, PLAYER: 1, BOT: 2}
+
+def board_code(b):
+    code = 0
+    for row in b:
+        for cell in row:
+            code = code * 3 + CELL_CODES[cell]
+    return code
+
+# Weight of each cell's digit in a board code, so a code can be updated move by move
+def build_cell_places(size):
+    return [3 ** (size * size - 1 - cell) for cell in range(size * size)]
+
+CELL_PLACES = build_cell_places(GRID_SIZE)
+
+# Returns the legal moves, trying the transposition table's best move first
+def ordered_moves(b, first=None):
+    moves = [(i, j) for i in range(GRID_SIZE) for j in range(GRID_SIZE) if b[i][j] == '_']
+    if first is not None:
+        move = divmod(first, GRID_SIZE)
+        if move in moves:
+            moves.remove(move)
+            moves.insert(0, move)
+    return moves
+
+# Counts, for each cell (row * GRID_SIZE + col), the live lines through it: lines that
+# hold marks of at most one side, so one of them could still complete it. Returns None
+# once no line is live, when the game can only end in a draw.
+def live_line_counts(b):
+    counts = [0] * (GRID_SIZE * GRID_SIZE)
+    live = False
+    for line in WIN_LINES:
+        has_player = has_bot = False
+        for row, col in line:
+            cell = b[row][col]
+            if cell == PLAYER:
+                has_player = True
+            elif cell == BOT:
+                has_bot = True
+        if not (has_player and has_bot):
+            live = True
+            for row, col in line:
+                counts[row * GRID_SIZE + col] += 1
+    return counts if live else None
+
+# Returns the moves minimax() searches: the transposition table's best move first, then
+# the cells on the most live lines. A cell on no live line changes nothing but whose
+# turn it is, wherever it is, so only one such cell is searched.
+def search_moves(b, first, live_counts):
+    moves = ordered_moves(b, first)
+    pinned = 1 if first is not None and moves and moves[0] == divmod(first, GRID_SIZE) else 0
+    moves[pinned:] = sorted(moves[pinned:], key=lambda move: -live_counts[move[0] * GRID_SIZE + move[1]])
+    dead = [move for move in moves if not live_counts[move[0] * GRID_SIZE + move[1]]]
+    for move in dead[1:]:
+        moves.remove(move)
+    return moves
+
+# Endgame tablebase consulted by minimax(), or None (see tablebase.py)
+# Set TABLEBASE_PATH to a file written by tablebase.py for the same GRID_SIZE
+TABLEBASE_PATH = None
+tablebase = None
+
+def open_tablebase(path):
+    global tablebase
+    base = Tablebase(path)
+    if base.grid_size != GRID_SIZE:
+        raise ValueError(f"{path} is for a {base.grid_size}x{base.grid_size} board, not {GRID_SIZE}x{GRID_SIZE}")
+    tablebase = base
+    return tablebase
+
+# Raised inside minimax() when a timed search runs past its deadline
+class SearchTimeout(Exception):
+    pass
+
+# perf_counter() time at which a timed search must stop, or None for no limit
+search_deadline = None
+
 # Evaluates all viable resulting positions from the current board state
 def minimax(b, depth, is_max, alpha, beta, max_depth):
     global analysis_count
+
+    # Stop a timed search once its deadline has passed
+    if search_deadline is not None and analysis_count & 255 == 0 and time.perf_counter() > search_deadline:
+        raise SearchTimeout
+
     score = evaluate(b)
 
-    # Check if the current board position is in the transposition table
-    board_key = tuple(map(tuple, b))
-    if board_key in transposition_table:
-        return transposition_table[board_key]
+    # Return score if the BOT has won
+    if score == 10:
+        return score - depth
 
-    # Return score if the BOT has won or if the maximum depth is reached
-    if score == 10 or depth == max_depth:
-        return score - depth + random.uniform(-0.01, 0.01)  # Add random adjustment
+    # Return score if the PLAYER has won
+    if score == -10:
+        return score + depth
 
-    # Return score if the PLAYER has won or if the maximum depth is reached
-    if score == -10 or depth == max_depth:
-        return score + depth + random.uniform(-0.01, 0.01)  # Add random adjustment
+    # Return the static score if the maximum depth is reached
+    if depth == max_depth:
+        return score
 
     # Return 0 if there are no moves remaining AND no winner
     if not remaining_moves(b):
         return 0
 
+    # Return 0 if neither side can still complete a line
+    live_counts = live_line_counts(b)
+    if live_counts is None:
+        return 0
+
+    # Use the exact value from the tablebase for endgame positions
+    # It is stored as a win or loss in some number of plies for the side to move
+    if tablebase is not None and sum(row.count('_') for row in b) <= tablebase.max_empty:
+        value = tablebase.probe(b)
+        if value is not None:
+            if value == 0:
+                return 0
+            plies = abs(value)
+            bot_wins = (value > 0) == is_max
+            return 10 - (depth + plies) if bot_wins else -10 + (depth + plies)
+
+    # Check if the current board position is in the transposition table
+    # An entry is only usable if it was searched at least as deep, and its bound fits the window
+    board_key = board_code(b)
+    entry = transposition_table.get(board_key)
+    tt_move = None
+    if entry is not None:
+        bound, entry_depth, value, tt_move = entry
+        if entry_depth >= max_depth - depth:
+            value = value_from_table(value, depth)
+            if bound == EXACT or (bound == LOWER and value >= beta) or (bound == UPPER and value <= alpha):
+                return value
+
+    # Look for immediate threats before generating moves
+    mark, opponent = (BOT, PLAYER) if is_max else (PLAYER, BOT)
+
+    # Take an immediate win if one exists
+    if winning_cells(b, mark):
+        return 10 - (depth + 1) if is_max else -10 + (depth + 1)
+
+    # If the opponent can win in two places, only one can be blocked and the game is lost.
+    # If it can win in one place, blocking it is the only move worth searching.
+    threats = winning_cells(b, opponent)
+    if len(threats) > 1:
+        return -10 + (depth + 2) if is_max else 10 - (depth + 2)
+    moves = list(threats) if threats else search_moves(b, tt_move, live_counts)
+
+    alpha_orig, beta_orig = alpha, beta
+    best_move = None
+
     # When it is the BOT's move...
     if is_max:
         best = -1000
 
-        # Traverse all cells
-        for i in range(GRID_SIZE):
-            for j in range(GRID_SIZE):
+        # Traverse all legal moves
+        for index, (i, j) in enumerate(moves):
 
-                # Check if this is a legal move
-                if b[i][j] == '_':
+            # Make the move
+            b[i][j] = BOT
 
-                    # Make the move
-                    b[i][j] = BOT
+            # Increment analysis count
+            analysis_count += 1
 
-                    # Increment analysis count
-                    analysis_count += 1
-
-                    # Call minimax recursively and store the best outcome
-                    best = max(best, minimax(b, depth + 1, not is_max, alpha, beta, max_depth))
-
-                    # Undo the move
-                    b[i][j] = '_'
+            # Call minimax recursively and store the best outcome
+            # A late, quiet move is searched less deeply first, and again in full if it looks good
+            if reduce_late_move(b, i, j, index, max_depth - depth):
+                lmr_stats['reductions'] += 1
+                value = minimax(b, depth + 1, not is_max, alpha, beta, max_depth - LMR_REDUCTION)
+                if value > alpha:
+                    lmr_stats['re_searches'] += 1
+                    value = minimax(b, depth + 1, not is_max, alpha, beta, max_depth)
+            else:
+                value = minimax(b, depth + 1, not is_max, alpha, beta, max_depth)
+            if value > best:
+                best, best_move = value, i * GRID_SIZE + j
 
-                    # Perform alpha-beta pruning
-                    alpha = max(alpha, best)
-                    if beta <= alpha:
-                        break
+            # Undo the move
+            b[i][j] = '_'
 
-        # Store the computed minimax value in the transposition table
-        transposition_table[board_key] = best
-        return best
+            # Perform alpha-beta pruning
+            alpha = max(alpha, best)
+            if beta <= alpha:
+                break
 
     # When it is the PLAYER's move...
     else:
         best = 1000
 
-        # Traverse all cells
-        for i in range(GRID_SIZE):
-            for j in range(GRID_SIZE):
+        # Traverse all legal moves
+        for index, (i, j) in enumerate(moves):
 
-                # Check if this is a legal move
-                if b[i][j] == '_':
+            # Make the move
+            b[i][j] = PLAYER
 
-                    # Make the move
-                    b[i][j] = PLAYER
+            # Increment analysis count
+            analysis_count += 1
 
-                    # Increment analysis count
-                    analysis_count += 1
+            # Call minimax recursively and store the best outcome
+            # A late, quiet move is searched less deeply first, and again in full if it looks good
+            if reduce_late_move(b, i, j, index, max_depth - depth):
+                lmr_stats['reductions'] += 1
+                value = minimax(b, depth + 1, not is_max, alpha, beta, max_depth - LMR_REDUCTION)
+                if value < beta:
+                    lmr_stats['re_searches'] += 1
+                    value = minimax(b, depth + 1, not is_max, alpha, beta, max_depth)
+            else:
+                value = minimax(b, depth + 1, not is_max, alpha, beta, max_depth)
+            if value < best:
+                best, best_move = value, i * GRID_SIZE + j
 
-                    # Call minimax recursively and store the best outcome
-                    best = min(best, minimax(b, depth + 1, not is_max, alpha, beta, max_depth))
+            # Undo the move
+            b[i][j] = '_'
 
-                    # Undo the move
-                    b[i][j] = '_'
+            # Perform alpha-beta pruning
+            beta = min(beta, best)
+            if beta <= alpha:
+                break
 
-                    # Perform alpha-beta pruning
-                    beta = min(beta, best)
-                    if beta <= alpha:
-                        break
+    # Store the computed minimax value in the transposition table, along with
+    # whether it is exact or only a bound because of an alpha-beta cutoff
+    if best <= alpha_orig:
+        bound = UPPER
+    elif best >= beta_orig:
+        bound = LOWER
+    else:
+        bound = EXACT
+    transposition_table[board_key] = (bound, max_depth - depth, value_to_table(best, depth), best_move)
+    return best
 
-        # Store the computed minimax value in the transposition table
-        transposition_table[board_key] = best
-        return best
+# Late move reductions: with LATE_MOVE_REDUCTIONS set, moves after the first
+# LMR_FULL_MOVES at a node are searched LMR_REDUCTION plies less deeply, unless they
+# create or block a threat, and are only re-searched at full depth if they beat the
+# window. This trades exactness for depth; it is meant for big boards.
+LATE_MOVE_REDUCTIONS = False
+LMR_FULL_MOVES = 3  # Moves searched at full depth before any reduction
+LMR_MIN_DEPTH = 3  # Remaining depth a node needs for its moves to be reduced
+LMR_REDUCTION = 1
+lmr_stats = {'reductions': 0, 're_searches': 0}
 
-# Returns the best possible move for the BOT with a depth limit
-def find_best_move_with_depth_limit(b, max_depth):
+# Returns True if the move just made at (i, j) neither leaves its side one mark short
+# of a line nor takes a line the opponent is two marks short of
+def quiet_move(b, i, j):
+    mark = b[i][j]
+    for line in CELL_LINES[i * GRID_SIZE + j]:
+        own = opponent = 0
+        for row, col in line:
+            cell = b[row][col]
+            if cell == mark:
+                own += 1
+            elif cell != '_':
+                opponent += 1
+        if opponent == 0 and own >= GRID_SIZE - 1:
+            return False
+        if own == 1 and opponent >= GRID_SIZE - 2:
+            return False
+    return True
+
+# Returns True if the move just made (the index-th at a node with `remaining` plies
+# left to search) should be searched at reduced depth first
+def reduce_late_move(b, i, j, index, remaining):
+    return LATE_MOVE_REDUCTIONS and index >= LMR_FULL_MOVES and remaining >= LMR_MIN_DEPTH and quiet_move(b, i, j)
+
+# Search tracing (see tracer.py). start_trace() points the name minimax at
+# traced_minimax(), so the recursive calls are traced too; untraced searches pay nothing.
+tracer = None
+untraced_minimax = minimax
+
+def start_trace(new_tracer):
+    global tracer, minimax
+    tracer = new_tracer
+    minimax = traced_minimax
+
+def stop_trace():
+    global tracer, minimax
+    minimax = untraced_minimax
+    tracer = None
+
+# Runs minimax() on one node and records it once it returns
+def traced_minimax(b, depth, is_max, alpha, beta, max_depth):
+    start = analysis_count
+    key = board_code(b)
+    entry = transposition_table.get(key)
+    value = untraced_minimax(b, depth, is_max, alpha, beta, max_depth)
+    nodes = analysis_count - start
+
+    # The entry answered the node if no moves were searched below it
+    tt_hit = tt_entry = False
+    if entry is not None and depth < max_depth:
+        bound, entry_depth, entry_value = entry[:3]
+        entry_value = value_from_table(entry_value, depth)
+        usable = entry_depth >= max_depth - depth and (bound == EXACT or (bound == LOWER and entry_value >= beta) or
+                                                       (bound == UPPER and entry_value <= alpha))
+        tt_hit = usable and not nodes
+        tt_entry = not tt_hit
+    tracer.record(key, depth, is_max, alpha, beta, value, nodes, tt_hit, tt_entry)
+    return value
+
+# Set ITERATIVE_SEARCH to search with minimax_iterative() instead of minimax(). It gives
+# the same results and analysis counts, but cannot be traced.
+ITERATIVE_SEARCH = False
+
+# The same search as minimax() without recursion. Each ply's move list, position in it,
+# window, best value, board code and empty cell count live in lists indexed by ply,
+# allocated once per call, and the move to undo is the one the ply's index points past.
+# Since every move is made here, the board code, empty count and each line's marks
+# are updated from the move instead of rescanning the board, which also tells when the
+# new mark completes a line or no live line is left. A finished node hands its value back to its parent's move loop.
+# Late move reductions lower a ply's horizon, as max_depth is lowered in minimax().
+def minimax_iterative(b, depth, is_max, alpha, beta, max_depth):
+    global analysis_count
+
+    plies = max_depth - depth + 1
+    move_lists = [None] * plies
+    indices = [0] * plies
+    alphas = [0] * plies
+    betas = [0] * plies
+    alpha_origs = [0] * plies
+    beta_origs = [0] * plies
+    bests = [0] * plies
+    best_moves = [None] * plies
+    keys = [0] * plies
+    empties = [0] * plies
+    scores = [0] * plies
+    horizons = [0] * plies  # max_depth as minimax() would see it, lowered by reductions
+    reduced = [False] * plies
+    maxes = [is_max if ply % 2 == 0 else not is_max for ply in range(plies)]
+    places = CELL_PLACES
+    size = GRID_SIZE
+
+    # Each side's marks on every line, kept up to date as moves are made and undone, the
+    # number of dead lines (holding both marks), and the live lines through each cell as
+    # live_line_counts() gives them. No live line left means a draw.
+    line_ids = [[k for k, line in enumerate(WIN_LINES) if (i, j) in line] for i in range(size) for j in range(size)]
+    line_cells = [[row * size + col for row, col in line] for line in WIN_LINES]
+    player_counts = [sum(b[row][col] == PLAYER for row, col in line) for line in WIN_LINES]
+    bot_counts = [sum(b[row][col] == BOT for row, col in line) for line in WIN_LINES]
+    dead = sum(1 for players, bots in zip(player_counts, bot_counts) if players and bots)
+    line_total = len(WIN_LINES)
+    live_counts = live_line_counts(b) or [0] * (size * size)
+
+    ply = 0
+    alphas[0], betas[0] = alpha, beta
+    keys[0] = board_code(b)
+    empties[0] = sum(row.count('_') for row in b)
+    scores[0] = evaluate(b)
+    horizons[0] = max_depth
+    entering = True
+    value = 0
+    while True:
+        node_max = maxes[ply]
+
+        if entering:
+            node_depth = depth + ply
+            horizon = horizons[ply]
+            score = scores[ply]
+            result = None
+
+            # Stop a timed search once its deadline has passed
+            if search_deadline is not None and analysis_count & 255 == 0 and time.perf_counter() > search_deadline:
+                raise SearchTimeout
+
+            if score == 10:
+                result = score - node_depth
+            elif score == -10:
+                result = score + node_depth
+            elif node_depth == horizon:
+                result = score
+            elif not empties[ply]:
+                result = 0
+            elif dead == line_total:
+                result = 0
+
+            # Endgame tablebase, as in minimax()
+            elif tablebase is not None and empties[ply] <= tablebase.max_empty and \
+                    (probed := tablebase.probe(b)) is not None:
+                if probed == 0:
+                    result = 0
+                else:
+                    bot_wins = (probed > 0) == node_max
+                    result = 10 - (node_depth + abs(probed)) if bot_wins else -10 + (node_depth + abs(probed))
+
+            if result is None:
+                # Transposition table
+                entry = transposition_table.get(keys[ply])
+                tt_move = None
+                if entry is not None:
+                    bound, entry_depth, entry_value, tt_move = entry
+                    if entry_depth >= horizon - node_depth:
+                        entry_value = value_from_table(entry_value, node_depth)
+                        if bound == EXACT or (bound == LOWER and entry_value >= betas[ply]) or \
+                                (bound == UPPER and entry_value <= alphas[ply]):
+                            result = entry_value
+
+            if result is None:
+                # Immediate win, double threat, or the single forced block
+                mark, opponent = (BOT, PLAYER) if node_max else (PLAYER, BOT)
+                if winning_cells(b, mark):
+                    result = 10 - (node_depth + 1) if node_max else -10 + (node_depth + 1)
+                else:
+                    threats = winning_cells(b, opponent)
+                    if len(threats) > 1:
+                        result = -10 + (node_depth + 2) if node_max else 10 - (node_depth + 2)
+                    else:
+                        if threats:
+                            move_lists[ply] = list(threats)
+                        else:
+                            move_lists[ply] = search_moves(b, tt_move, live_counts)
+                        indices[ply] = 0
+                        alpha_origs[ply], beta_origs[ply] = alphas[ply], betas[ply]
+                        bests[ply] = -1000 if node_max else 1000
+                        best_moves[ply] = None
+
+            # A node settled on entry hands its value straight back
+            if result is not None:
+                value = result
+                ply -= 1
+                if ply < 0:
+                    return value
+                entering = False
+                continue
+
+        else:
+            # A child has returned. If it was searched at reduced depth and beat the
+            # window, search it again at full depth with the move still made.
+            i, j = move_lists[ply][indices[ply] - 1]
+            if reduced[ply] and (value > alphas[ply] if node_max else value < betas[ply]):
+                lmr_stats['re_searches'] += 1
+                reduced[ply] = False
+                horizons[ply + 1] = horizons[ply]
+                alphas[ply + 1], betas[ply + 1] = alphas[ply], betas[ply]
+                ply += 1
+                entering = True
+                continue
+
+            # Undo its move and fold its value in
+            b[i][j] = '_'
+            for k in line_ids[i * size + j]:
+                if node_max:
+                    bot_counts[k] -= 1
+                    revived = not bot_counts[k] and player_counts[k]
+                else:
+                    player_counts[k] -= 1
+                    revived = not player_counts[k] and bot_counts[k]
+                if revived:
+                    dead -= 1
+                    for line_cell in line_cells[k]:
+                        live_counts[line_cell] += 1
+            if node_max:
+                if value > bests[ply]:
+                    bests[ply], best_moves[ply] = value, i * size + j
+                alphas[ply] = max(alphas[ply], bests[ply])
+            else:
+                if value < bests[ply]:
+                    bests[ply], best_moves[ply] = value, i * size + j
+                betas[ply] = min(betas[ply], bests[ply])
+
+        # Search the next move, unless the window has closed or the moves have run out
+        moves = move_lists[ply]
+        index = indices[ply]
+        if index < len(moves) and alphas[ply] < betas[ply]:
+            i, j = moves[index]
+            indices[ply] = index + 1
+            mark = BOT if node_max else PLAYER
+            b[i][j] = mark
+            analysis_count += 1
+
+            cell = i * size + j
+            keys[ply + 1] = keys[ply] + CELL_CODES[mark] * places[cell]
+            empties[ply + 1] = empties[ply] - 1
+            scores[ply + 1] = 0
+            for k in line_ids[cell]:
+                if node_max:
+                    killed = not bot_counts[k] and player_counts[k]
+                    bot_counts[k] += 1
+                    if bot_counts[k] == size:
+                        scores[ply + 1] = 10
+                else:
+                    killed = not player_counts[k] and bot_counts[k]
+                    player_counts[k] += 1
+                    if player_counts[k] == size:
+                        scores[ply + 1] = -10
+                if killed:
+                    dead += 1
+                    for line_cell in line_cells[k]:
+                        live_counts[line_cell] -= 1
+
+            # A late, quiet move is searched less deeply first, as in minimax()
+            reduced[ply] = reduce_late_move(b, i, j, index, horizons[ply] - (depth + ply))
+            if reduced[ply]:
+                lmr_stats['reductions'] += 1
+                horizons[ply + 1] = horizons[ply] - LMR_REDUCTION
+            else:
+                horizons[ply + 1] = horizons[ply]
+
+            alphas[ply + 1], betas[ply + 1] = alphas[ply], betas[ply]
+            ply += 1
+            entering = True
+            continue
+
+        # The node is finished: store it like minimax() does and return to the parent
+        best = bests[ply]
+        if best <= alpha_origs[ply]:
+            bound = UPPER
+        elif best >= beta_origs[ply]:
+            bound = LOWER
+        else:
+            bound = EXACT
+        transposition_table[keys[ply]] = (bound, horizons[ply] - (depth + ply), value_to_table(best, depth + ply),
+                                          best_moves[ply])
+        value = best
+        ply -= 1
+        if ply < 0:
+            return value
+        entering = False
+
+# Root moves scoring within RANDOM_MARGIN of the best move are picked from at random,
+# to keep the bot from playing the same thing every time
+RANDOM_MARGIN = 0
+rng = random.Random()
+
+# Seeds the choice between root moves, so benchmark runs repeat exactly
+def seed_random(seed):
+    rng.seed(seed)
+
+# Aspiration windows: the root is searched with a narrow window around the expected
+# score (the previous iteration's, or the previous move's), widened step by step when
+# the result falls outside it
+ASPIRATION_WINDOW = 1  # Initial half-width; scores are small integers
+ASPIRATION_STEPS = 3  # Doublings before the window is opened all the way
+aspiration_stats = {'searches': 0, 'fail_low': 0, 'fail_high': 0}
+
+# Root score of the last search, from the BOT's point of view
+last_score = None
+
+# Searches every root move within (alpha, beta) and returns (best value, scored moves).
+# Values at or below the window's lower bound are only upper bounds, and a move reaching
+# beta stops the search, since the window has then failed high.
+def search_root(b, max_depth, alpha, beta):
+    search = minimax_iterative if ITERATIVE_SEARCH else minimax
     best_val = -1000
-    best_move = (-1, -1)
+    scored_moves = []
 
-    # Evaluate all legal moves, return cell with optimal minimax value
+    # Evaluate all legal moves
     for i in range(GRID_SIZE):
         for j in range(GRID_SIZE):
 
@@ -206,69 +743,283 @@ def find_best_move_with_depth_limit(b, max_depth):
                 b[i][j] = BOT
 
                 # Store the minimax value of the move with depth limit
-                move_val = minimax(b, 0, False, -float('inf'), float('inf'), max_depth)
+                # Moves further than RANDOM_MARGIN below the best only need to be shown worse,
+                # so the window's lower bound follows the best value found so far
+                lower = max(alpha, best_val - RANDOM_MARGIN - 1)
+                move_val = search(b, 0, False, lower, beta, max_depth)
 
                 # Undo the move
                 b[i][j] = '_'
 
-                # If the value of the move just analyzed is greater than
-                # the best value, update best_val and store the move coordinates
-                if move_val > best_val:
-                    best_move = (i, j)
-                    best_val = move_val
+                best_val = max(best_val, move_val)
+                scored_moves.append((move_val, (i, j)))
+                if best_val >= beta:
+                    return best_val, scored_moves
+
+    return best_val, scored_moves
+
+# Returns the best possible move for the BOT with a depth limit
+# guess is the expected root score; by default the previous move's score is used
+def find_best_move_with_depth_limit(b, max_depth, guess=None):
+    global last_score
+
+    # Take an immediate win, or block the PLAYER's only immediate win, without searching
+    wins = winning_cells(b, BOT)
+    if wins:
+        return rng.choice(sorted(wins))
+    threats = winning_cells(b, PLAYER)
+    if len(threats) == 1:
+        return threats.pop()
+
+    # Two plies have been played since the previous move's search, which moves any
+    # win or loss two plies closer
+    if guess is None and last_score is not None:
+        guess = value_to_table(last_score, 2)
+
+    # Start with a narrow window around the guess (or a full window without one)
+    delta = ASPIRATION_WINDOW
+    steps = 0
+    if guess is None:
+        alpha, beta = -float('inf'), float('inf')
+    else:
+        alpha, beta = guess - delta - RANDOM_MARGIN, guess + delta
+
+    while True:
+        aspiration_stats['searches'] += 1
+        best_val, scored_moves = search_root(b, max_depth, alpha, beta)
+
+        # Widen whichever side failed, opening it fully after ASPIRATION_STEPS tries.
+        # The lower bound must also leave every move within RANDOM_MARGIN exact.
+        steps += 1
+        delta *= 2
+        if best_val >= beta:
+            aspiration_stats['fail_high'] += 1
+            beta = best_val + delta if steps < ASPIRATION_STEPS else float('inf')
+        elif best_val - RANDOM_MARGIN <= alpha:
+            aspiration_stats['fail_low'] += 1
+            alpha = best_val - RANDOM_MARGIN - delta if steps < ASPIRATION_STEPS else -float('inf')
+        else:
+            break
+
+    last_score = best_val
+
+    # Pick at random between the moves within RANDOM_MARGIN of the best
+    candidates = [move for move_val, move in scored_moves if move_val >= best_val - RANDOM_MARGIN]
+    if not candidates:
+        return (-1, -1)
+    return rng.choice(candidates)
+
+# Deepest search completed by the last find_best_move_timed() call
+timed_depth = None
+
+# Returns the best move found within time_budget seconds using iterative deepening
+# Each completed depth leaves its results in the transposition table for the next one,
+# and its score centers the next depth's aspiration window
+def find_best_move_timed(b, time_budget):
+    global search_deadline, timed_depth
+
+    # Search a copy, since an aborted search leaves its moves on the board
+    work = [row[:] for row in b]
+    empty = sum(row.count('_') for row in b)
+    best_move = None
+    guess = None
+    timed_depth = None
 
+    search_deadline = time.perf_counter() + time_budget
+    try:
+        for depth in range(empty):
+            best_move = find_best_move_with_depth_limit(work, depth, guess)
+            guess = last_score
+            timed_depth = depth
+    except SearchTimeout:
+        pass
+    finally:
+        search_deadline = None
+
+    # Fall back to the first legal move if not even one depth finished
+    if best_move is None:
+        best_move = ordered_moves(b)[0]
     return best_move
 
+# Follows the transposition table's best moves from a position, up to max_depth plies
+# An immediate win ends the line even though minimax() does not store it
+def principal_variation(b, is_max, max_depth):
+    work = [row[:] for row in b]
+    line = []
+    for _ in range(max_depth):
+        if evaluate(work) != 0 or not remaining_moves(work):
+            break
+        mark = BOT if is_max else PLAYER
+        wins = winning_cells(work, mark)
+        if wins:
+            line.append(min(wins))
+            break
+        entry = transposition_table.get(board_code(work))
+        if entry is None or entry[3] is None:
+            break
+        move = divmod(entry[3], GRID_SIZE)
+        if work[move[0]][move[1]] != '_':
+            break
+        work[move[0]][move[1]] = mark
+        line.append(move)
+        is_max = not is_max
+    return line
+
+# Multi-PV analysis: scores every root move for the side to move in one pass, sharing
+# the transposition table between moves. Returns (score, move, principal variation)
+# for the top k moves (all of them if k is None), best first, with scores from the
+# point of view of the side to move. Moves that cannot reach the top k are only shown
+# to be worse, so they are searched with a narrower window.
+def analyze(b, max_depth, k=None):
+    is_max = sum(row.count(PLAYER) for row in b) > sum(row.count(BOT) for row in b)
+    mark = BOT if is_max else PLAYER
+    entry = transposition_table.get(board_code(b))
+    search = minimax_iterative if ITERATIVE_SEARCH else minimax
+    scored = []
+
+    for i, j in ordered_moves(b, entry[3] if entry is not None else None):
+        # A move needs an exact score only if it can beat the k-th best so far
+        kth = sorted(score for score, _ in scored)[-k] if k and len(scored) >= k else None
+
+        b[i][j] = mark
+        if is_max:
+            lower = kth - 1 if kth is not None else -float('inf')
+            score = search(b, 0, False, lower, float('inf'), max_depth)
+        else:
+            upper = -(kth - 1) if kth is not None else float('inf')
+            score = -search(b, 0, True, -float('inf'), upper, max_depth)
+        b[i][j] = '_'
+        scored.append((score, (i, j)))
+
+    scored.sort(key=lambda item: -item[0])
+    results = []
+    for score, (i, j) in scored[:k]:
+        b[i][j] = mark
+        line = [(i, j)] + principal_variation(b, not is_max, max_depth)
+        b[i][j] = '_'
+        results.append((score, (i, j), line))
+    return results
+
 max_depth = 9  # Adjust this as needed. On my PC, 3x3 can handle 9, 4x4 can handle 5, 5x5 can handle 3
 
-# Initialize gamestate and other variables
-player_turn = True  # True if it's the PLAYER's turn, False if it's the BOT's turn
-board = [['_' for _ in range(GRID_SIZE)] for _ in range(GRID_SIZE)]
+# Search backend for the BOT: 'minimax', or 'mcts' for grids of 6x6 and up
+BACKEND = 'minimax'
+MCTS_TIME = 1.0  # Seconds per move
+MCTS_WORKERS = 1  # Processes searching in parallel
+
+# Every finished game is appended to this log (see gamelog.py and replay.py); None to disable
+GAME_LOG_PATH = 'games.rec'
 
-# Begin counting the number of positions analyzed
-global analysis_count
+# Returns the BOT's move using the configured backend
+def find_best_move(b):
+    if BACKEND == 'mcts':
+        return mcts.find_best_move(b, MCTS_TIME, MCTS_WORKERS)
+    return find_best_move_with_depth_limit(b, max_depth)
+
+# Positions analyzed by the current search
 analysis_count = 0
 
-while True:
-    for event in pygame.event.get():
-        if event.type == pygame.QUIT:
+def main():
+    # Initialize Pygame and set up the window
+    global screen
+    pygame.init()
+    screen = pygame.display.set_mode((WIDTH, HEIGHT))
+    pygame.display.set_caption("Tic Tac Toe")
+
+    # Keep the transposition table on disk if requested; it is flushed when the program exits
+    if TABLE_PATH:
+        open_persistent_table(TABLE_PATH)
+    elif COMPACT_TABLE:
+        use_compact_table()
+
+    # Stop searches at endgame positions if a tablebase is available
+    if TABLEBASE_PATH:
+        open_tablebase(TABLEBASE_PATH)
+
+    # Initialize gamestate and other variables
+    player_turn = True  # True if it's the PLAYER's turn, False if it's the BOT's turn
+    board = [['_' for _ in range(GRID_SIZE)] for _ in range(GRID_SIZE)]
+    moves = []  # (row, col, mark, seconds, positions analyzed) for the game log
+
+    # Press 'h' to show the score of every move for the PLAYER
+    show_heatmap = False
+    heatmap = None
+
+    # Begin counting the number of positions analyzed
+    global analysis_count
+    analysis_count = 0
+
+    while True:
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                pygame.quit()
+                sys.exit()
+
+            if event.type == pygame.MOUSEBUTTONDOWN and player_turn:
+                x, y = event.pos
+                col = x // CELL_SIZE
+                row = y // CELL_SIZE
+                if board[row][col] == '_':
+                    board[row][col] = PLAYER
+                    moves.append((row, col, PLAYER, 0, 0, False))
+                    player_turn = False
+                    heatmap = None
+
+            if event.type == pygame.KEYDOWN and event.key == pygame.K_h:
+                show_heatmap = not show_heatmap
+
+        # Check for game over conditions or continue with BOT's move
+        if not remaining_moves(board) or evaluate(board) != 0:
+
+            # Handle game over
+            if evaluate(board) > 0:
+                victor = "the algorithm"
+            elif evaluate(board) < 0:
+                victor = "the player"
+            else:
+                victor = "neither player"
+            print(f"Game over, {victor} wins")
+
+            # Record the game
+            if GAME_LOG_PATH:
+                winner = BOT if evaluate(board) > 0 else PLAYER if evaluate(board) < 0 else None
+                engine = f"mcts@{MCTS_TIME}" if BACKEND == 'mcts' else f"full:{max_depth}"
+                append_game(GAME_LOG_PATH, GRID_SIZE, moves, winner, engine)
+
             pygame.quit()
             sys.exit()
 
-        if event.type == pygame.MOUSEBUTTONDOWN and player_turn:
-            x, y = event.pos
-            col = x // CELL_SIZE
-            row = y // CELL_SIZE
-            if board[row][col] == '_':
-                board[row][col] = PLAYER
-                player_turn = False
-
-    # Check for game over conditions or continue with BOT's move
-    if not remaining_moves(board) or evaluate(board) != 0:
-
-        # Handle game over
-        if evaluate(board) > 0:
-            victor = "the algorithm"
-        elif evaluate(board) < 0:
-            victor = "the player"
-        else:
-            victor = "neither player"
-        print(f"Game over, {victor} wins")
-
-        pygame.quit()
-        sys.exit()
-
-    if not player_turn:
-        best_move = find_best_move_with_depth_limit(board, max_depth)
-        board[best_move[0]][best_move[1]] = BOT
-        player_turn = True
-
-        # Print and reset the number of positions analyzed
-        print(f"Positions analyzed: {analysis_count}")
-        analysis_count = 0
-
-    # Draw the board
-    screen.fill(BLACK)
-    draw_grid()
-    draw_board(board)
-    pygame.display.flip()
+        if not player_turn:
+            start = time.perf_counter()
+            best_move = find_best_move(board)
+            elapsed = time.perf_counter() - start
+            board[best_move[0]][best_move[1]] = BOT
+            player_turn = True
+
+            # Print and reset the number of positions analyzed
+            nodes = mcts.analysis_count if BACKEND == 'mcts' else analysis_count
+            if BACKEND == 'mcts':
+                print(f"Playouts: {nodes}")
+            else:
+                print(f"Positions analyzed: {nodes}")
+            if LATE_MOVE_REDUCTIONS:
+                print(f"Late move reductions: {lmr_stats['reductions']}, re-searched: {lmr_stats['re_searches']}")
+                lmr_stats.update(reductions=0, re_searches=0)
+            moves.append((best_move[0], best_move[1], BOT, elapsed, nodes, True))
+            analysis_count = 0
+
+        # Analyze the PLAYER's moves once per position while the heatmap is shown
+        if show_heatmap and player_turn and heatmap is None:
+            heatmap = analyze(board, max_depth)
+            analysis_count = 0
+
+        # Draw the board
+        screen.fill(BLACK)
+        if show_heatmap and heatmap:
+            draw_heatmap(heatmap)
+        draw_grid()
+        draw_board(board)
+        pygame.display.flip()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+# Perft: exact move-tree enumeration.
+# Counts every legal move sequence to a given depth, and every finished game along the
+# way, with the compact bitboard move generator. The counts are checked against the
+# list-of-lists board code of minimax-full.py, so a faster board representation can be
+# shown to produce exactly the same game tree. It also measures raw move-generator speed
+# in nodes per second, with no search logic involved.
+#
+# Example: python perft.py --grid 3 --depth 9          (3x3 has 255168 possible games)
+#          python perft.py --grid 4 --depth 5 --workers 4
+
+import argparse
+import multiprocessing
+import time
+
+from bitboard import from_board, full_mask, player_to_move, wins_with
+from pnsearch import board_from_moves
+from variants import load_variant
+
+
+# Counts (leaves, games, nodes) below a list-of-lists position using the engine's own
+# helpers: leaves are the sequences of exactly `depth` moves, games the sequences that
+# finish the game (by a win or a full board) within `depth` moves, and nodes every
+# position generated
+def perft_reference(engine, b, mark, depth):
+    leaves = games = nodes = 0
+    other = engine.BOT if mark == engine.PLAYER else engine.PLAYER
+    for i in range(engine.GRID_SIZE):
+        for j in range(engine.GRID_SIZE):
+            if b[i][j] == '_':
+                b[i][j] = mark
+                nodes += 1
+                if engine.evaluate(b) != 0 or not engine.remaining_moves(b):
+                    games += 1
+                    leaves += depth == 1
+                elif depth == 1:
+                    leaves += 1
+                else:
+                    sub_leaves, sub_games, sub_nodes = perft_reference(engine, b, other, depth - 1)
+                    leaves += sub_leaves
+                    games += sub_games
+                    nodes += sub_nodes
+                b[i][j] = '_'
+    return leaves, games, nodes
+
+
+# The same count on the compact board: own/other are the bitmasks of the side to move
+# and its opponent
+def perft_bits(own, other, size, full, depth):
+    leaves = games = nodes = 0
+    free = full & ~(own | other)
+    while free:
+        bit = free & -free
+        free ^= bit
+        placed = own | bit
+        nodes += 1
+        if wins_with(placed, bit.bit_length() - 1, size) or placed | other == full:
+            games += 1
+            leaves += depth == 1
+        elif depth == 1:
+            leaves += 1
+        else:
+            sub_leaves, sub_games, sub_nodes = perft_bits(other, placed, size, full, depth - 1)
+            leaves += sub_leaves
+            games += sub_games
+            nodes += sub_nodes
+    return leaves, games, nodes
+
+
+# Counts one root move's subtree; used to split the work across processes
+def perft_root_move(task):
+    own, other, bit, size, depth = task
+    full = full_mask(size)
+    placed = own | bit
+    if wins_with(placed, bit.bit_length() - 1, size) or placed | other == full:
+        return int(depth == 1), 1, 1
+    if depth == 1:
+        return 1, 0, 1
+    leaves, games, nodes = perft_bits(other, placed, size, full, depth - 1)
+    return leaves, games, nodes + 1
+
+
+# Runs perft on the compact board, splitting the root moves across worker processes
+def perft(b, depth, workers=1):
+    size = len(b)
+    x_bits, o_bits = from_board(b)
+    own, other = (x_bits, o_bits) if player_to_move(x_bits, o_bits) else (o_bits, x_bits)
+    if workers == 1:
+        return perft_bits(own, other, size, full_mask(size), depth)
+
+    free = full_mask(size) & ~(x_bits | o_bits)
+    tasks = [(own, other, 1 << cell, size, depth) for cell in range(size * size) if free >> cell & 1]
+    with multiprocessing.Pool(workers) as pool:
+        results = pool.map(perft_root_move, tasks)
+    return tuple(sum(counts) for counts in zip(*results))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Count the game tree and check it against the reference board")
+    parser.add_argument('--grid', type=int, default=3)
+    parser.add_argument('--depth', type=int, default=9)
+    parser.add_argument('--moves', default='', help='starting moves, e.g. "1,1 0,2"')
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--no-check', action='store_true', help="skip the (slow) reference count")
+    args = parser.parse_args()
+
+    engine = load_variant('full')
+    if engine.GRID_SIZE != args.grid:
+        engine.set_grid_size(args.grid)
+    b = board_from_moves(args.moves, engine)
+
+    start = time.perf_counter()
+    leaves, games, nodes = perft(b, args.depth, args.workers)
+    elapsed = time.perf_counter() - start
+    print(f"depth {args.depth}: {leaves} leaves, {games} finished games, {nodes} nodes")
+    print(f"bitboard:  {elapsed:.2f}s, {nodes / elapsed:.0f} nodes/s")
+
+    if not args.no_check:
+        x_bits, o_bits = from_board(b)
+        mark = engine.PLAYER if player_to_move(x_bits, o_bits) else engine.BOT
+        start = time.perf_counter()
+        expected = perft_reference(engine, b, mark, args.depth)
+        elapsed = time.perf_counter() - start
+        print(f"reference: {elapsed:.2f}s, {expected[2] / elapsed:.0f} nodes/s")
+        if expected != (leaves, games, nodes):
+            raise SystemExit(f"MISMATCH: reference counts {expected[0]} leaves, {expected[1]} finished games, "
+                             f"{expected[2]} nodes")
+        print("Counts match the reference implementation")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,196 @@
+# Proof-number search solver.
+# Proves or disproves the game value of a position instead of estimating it with a
+# depth-limited search, so results can be used to build opening books and tablebases.
+# It uses the board, win detection and board codes of minimax-full.py.
+#
+# Example: python pnsearch.py --grid 4 --moves "1,1 2,2" --max-nodes 2000000
+
+import argparse
+import collections
+import time
+
+from variants import load_variant
+
+# Stands in for an infinite proof or disproof number
+INFINITY = 10 ** 9
+
+PNResult = collections.namedtuple('PNResult', 'status proof_size nodes')
+SolveResult = collections.namedtuple('SolveResult', 'value proof_size nodes seconds')
+
+
+class Node:
+    __slots__ = ('move', 'parent', 'children', 'is_or', 'pn', 'dn', 'code')
+
+    def __init__(self, move, parent, is_or, code):
+        self.move = move
+        self.parent = parent
+        self.children = None
+        self.is_or = is_or
+        self.pn = 1
+        self.dn = 1
+        self.code = code
+
+
+# Returns the mark of the side to move; the PLAYER ('X') always moves first
+def side_to_move(b, engine):
+    marks = [cell for row in b for cell in row]
+    return engine.PLAYER if marks.count(engine.PLAYER) == marks.count(engine.BOT) else engine.BOT
+
+
+# Proves or disproves "attacker wins" from a position, expanding at most max_nodes nodes.
+# OR nodes are the attacker's turn, AND nodes the defender's.
+class ProofNumberSearch:
+    def __init__(self, engine, attacker, max_nodes=1000000):
+        self.engine = engine
+        self.attacker = attacker
+        self.defender = engine.PLAYER if attacker == engine.BOT else engine.BOT
+        self.max_nodes = max_nodes
+        self.nodes = 0
+
+        # Proven (True) and disproven (False) positions by board code, shared between transpositions
+        self.solved = {}
+
+    # Sets the proof and disproof numbers of a new node from the position alone, if possible
+    def _evaluate(self, node, b, to_move):
+        engine = self.engine
+        score = engine.evaluate(b)
+        if score != 0:
+            won = (score > 0) == (self.attacker == engine.BOT)
+        elif not engine.remaining_moves(b):
+            won = False
+        elif engine.winning_cells(b, to_move):
+            won = to_move == self.attacker
+        else:
+            won = self.solved.get(node.code)
+            if won is None:
+                return
+        node.pn, node.dn = (0, INFINITY) if won else (INFINITY, 0)
+
+    # Creates the children of a leaf, with the leaf's position on the board
+    def _expand(self, node, b):
+        engine = self.engine
+        mover = self.attacker if node.is_or else self.defender
+        node.children = []
+        for i in range(engine.GRID_SIZE):
+            for j in range(engine.GRID_SIZE):
+                if b[i][j] == '_':
+                    b[i][j] = mover
+                    child = Node((i, j), node, not node.is_or, engine.board_code(b))
+                    self._evaluate(child, b, self.defender if node.is_or else self.attacker)
+                    b[i][j] = '_'
+                    node.children.append(child)
+        self.nodes += len(node.children)
+
+    # Recomputes a node's numbers from its children
+    @staticmethod
+    def _update(node):
+        if node.is_or:
+            node.pn = min(child.pn for child in node.children)
+            node.dn = min(INFINITY, sum(child.dn for child in node.children))
+        else:
+            node.pn = min(INFINITY, sum(child.pn for child in node.children))
+            node.dn = min(child.dn for child in node.children)
+
+    def run(self, b):
+        engine = self.engine
+        b = [row[:] for row in b]
+        to_move = side_to_move(b, engine)
+        root = Node(None, None, to_move == self.attacker, engine.board_code(b))
+        self._evaluate(root, b, to_move)
+
+        while root.pn and root.dn and self.nodes < self.max_nodes:
+            # Walk down to the most-proving node, playing its moves on the board
+            node, path = root, []
+            while node.children is not None:
+                if node.is_or:
+                    node = min(node.children, key=lambda child: child.pn)
+                else:
+                    node = min(node.children, key=lambda child: child.dn)
+                i, j = node.move
+                b[i][j] = self.defender if node.is_or else self.attacker
+                path.append(node.move)
+
+            self._expand(node, b)
+
+            # Update the ancestors, remembering every position that becomes solved
+            while node is not None:
+                self._update(node)
+                if node.pn == 0 or node.dn == 0:
+                    self.solved[node.code] = node.pn == 0
+                node = node.parent
+
+            for i, j in path:
+                b[i][j] = '_'
+
+        if root.pn == 0:
+            return PNResult('proven', proof_tree_size(root, proven=True), self.nodes)
+        if root.dn == 0:
+            return PNResult('disproven', proof_tree_size(root, proven=False), self.nodes)
+        return PNResult('unknown', 0, self.nodes)
+
+
+# Counts the nodes of the proof (or disproof) tree below a solved node.
+# A solved choice node needs one solved child, the other side's nodes need all of them.
+def proof_tree_size(node, proven=True):
+    if node.children is None:
+        return 1
+    needs_one = node.is_or if proven else not node.is_or
+    solved = [child for child in node.children if (child.pn if proven else child.dn) == 0]
+    if needs_one:
+        return 1 + min(proof_tree_size(child, proven) for child in solved)
+    return 1 + sum(proof_tree_size(child, proven) for child in solved)
+
+
+# Solves a position for the side to move: 'win', 'draw', 'loss', or 'unknown' if the
+# node budget runs out. The budget is shared by the two searches this needs.
+def solve(b, max_nodes=1000000, engine=None):
+    engine = engine or load_variant('full')
+    start = time.perf_counter()
+    to_move = side_to_move(b, engine)
+    opponent = engine.PLAYER if to_move == engine.BOT else engine.BOT
+
+    # First try to prove a win for the side to move
+    first = ProofNumberSearch(engine, to_move, max_nodes).run(b)
+    if first.status == 'proven':
+        return SolveResult('win', first.proof_size, first.nodes, time.perf_counter() - start)
+
+    # Then try to prove a win for the opponent; disproving both means a draw
+    second = ProofNumberSearch(engine, opponent, max_nodes - first.nodes).run(b)
+    nodes = first.nodes + second.nodes
+    if second.status == 'proven':
+        return SolveResult('loss', second.proof_size, nodes, time.perf_counter() - start)
+    if first.status == 'disproven' and second.status == 'disproven':
+        return SolveResult('draw', first.proof_size + second.proof_size, nodes, time.perf_counter() - start)
+    return SolveResult('unknown', 0, nodes, time.perf_counter() - start)
+
+
+# Builds a board from moves like "1,1 0,2", played alternately starting with the PLAYER
+def board_from_moves(moves, engine):
+    b = [['_'] * engine.GRID_SIZE for _ in range(engine.GRID_SIZE)]
+    mark = engine.PLAYER
+    for move in moves.split():
+        row, col = (int(x) for x in move.split(','))
+        b[row][col] = mark
+        mark = engine.BOT if mark == engine.PLAYER else engine.PLAYER
+    return b
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Prove the game value of a position with proof-number search")
+    parser.add_argument('--grid', type=int, default=3)
+    parser.add_argument('--moves', default='', help='moves played so far, e.g. "1,1 0,2"')
+    parser.add_argument('--max-nodes', type=int, default=1000000, help='node budget for the whole solve')
+    args = parser.parse_args()
+
+    engine = load_variant('full')
+    if args.grid != engine.GRID_SIZE:
+        engine.set_grid_size(args.grid)
+    b = board_from_moves(args.moves, engine)
+
+    result = solve(b, args.max_nodes, engine)
+    print(f"Side to move ({side_to_move(b, engine)}): {result.value}")
+    print(f"Proof tree size: {result.proof_size}, nodes created: {result.nodes}, {result.seconds:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
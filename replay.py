@@ -0,0 +1,69 @@
+# Replays logged games against an engine build.
+# Every position in a game record log (see gamelog.py) where the logged side had to
+# move is searched again by the given engine, and the time and positions analyzed per
+# move are reported as a distribution. Engine specs are the same as in tournament.py.
+#
+# Example: python replay.py games.rec full:9 --only-engine-moves
+
+import argparse
+import time
+
+from gamelog import read_games
+from tournament import Engine, quantile
+
+
+# Yields (grid size, board, mark to move, logged move) for every move in the log
+def logged_positions(path, only_engine_moves=False, grid_size=None):
+    for game in read_games(path):
+        if grid_size is not None and game['grid_size'] != grid_size:
+            continue
+        size = game['grid_size']
+        board = [['_'] * size for _ in range(size)]
+        for row, col, mark, seconds, nodes, by_engine in game['moves']:
+            if not only_engine_moves or by_engine:
+                yield size, [r[:] for r in board], mark, (row, col)
+            board[row][col] = mark
+
+
+def replay(path, spec, only_engine_moves=False, grid_size=None, limit=None):
+    engines = {}
+    times, nodes = [], []
+    agreed = 0
+    for size, board, mark, logged in logged_positions(path, only_engine_moves, grid_size):
+        if limit is not None and len(times) >= limit:
+            break
+        key = (size, mark)
+        if key not in engines:
+            engines[key] = Engine(spec, mark, size)
+        move, seconds, count = engines[key].choose(board, mark)
+        times.append(seconds * 1000)
+        nodes.append(count)
+        agreed += tuple(move) == logged
+    return times, nodes, agreed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Re-run logged positions through an engine and report latency")
+    parser.add_argument('log', help="game record log written by the game, tournament.py or sessions.py")
+    parser.add_argument('engine', help="engine spec, e.g. full:9, full@0.1, mcts@0.5, ab")
+    parser.add_argument('--only-engine-moves', action='store_true', help="skip positions where a human moved")
+    parser.add_argument('--grid', type=int, default=None, help="only replay games on this board size")
+    parser.add_argument('--limit', type=int, default=None, help="stop after this many positions")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    times, nodes, agreed = replay(args.log, args.engine, args.only_engine_moves, args.grid, args.limit)
+    if not times:
+        print("No positions to replay")
+        return
+
+    print(f"{len(times)} positions replayed in {time.perf_counter() - start:.1f}s, "
+          f"{agreed} ({100 * agreed / len(times):.0f}%) same move as logged")
+    print(f"ms per move:    mean {sum(times) / len(times):.2f}  p50 {quantile(times, 0.5):.2f}  "
+          f"p90 {quantile(times, 0.9):.2f}  p99 {quantile(times, 0.99):.2f}  max {max(times):.2f}")
+    print(f"nodes per move: mean {sum(nodes) / len(nodes):.0f}  p50 {quantile(nodes, 0.5)}  "
+          f"p99 {quantile(nodes, 0.99)}  max {max(nodes)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,199 @@
+# Benchmarks the recursive and iterative search drivers of minimax-full.py.
+# Both searches run on the same positions with an empty transposition table each time.
+# Their values and analysis counts are checked to match, and their speeds are reported
+# in positions analyzed per second.
+#
+# With --budget, it instead measures how deep timed searches get in that many seconds
+# per position, with and without late move reductions.
+#
+# With --check, it instead checks the engine's values against a plain full-width
+# minimax: both drivers from an empty table and from a table kept across positions, the
+# per-move scores of analyze(), and the threaded search of threaded.py.
+#
+# Example: python searchbench.py --grid 4 --depth 6 --positions 20
+#          python searchbench.py --grid 5 --budget 1 --positions 10
+#          python searchbench.py --check --grid 4 --depth 4 --max-plies 8 --positions 20
+
+import argparse
+import random
+import time
+
+import threaded
+from variants import load_variant
+
+
+# Returns `count` boards with a few random moves played and no winner yet
+def random_positions(engine, count, max_plies, seed):
+    rng = random.Random(seed)
+    positions = []
+    while len(positions) < count:
+        b = [['_'] * engine.GRID_SIZE for _ in range(engine.GRID_SIZE)]
+        cells = [(i, j) for i in range(engine.GRID_SIZE) for j in range(engine.GRID_SIZE)]
+        rng.shuffle(cells)
+        plies = rng.randint(0, max_plies)
+        for ply, (i, j) in enumerate(cells[:plies]):
+            b[i][j] = engine.PLAYER if ply % 2 == 0 else engine.BOT
+        if engine.evaluate(b) == 0 and engine.remaining_moves(b):
+            positions.append((b, plies % 2 == 1))
+    return positions
+
+
+# Searches every position with one driver; returns (values, positions analyzed, seconds)
+def run(engine, search, positions, depth):
+    values = []
+    nodes = 0
+    elapsed = 0.0
+    for b, is_max in positions:
+        engine.transposition_table.clear()
+        engine.analysis_count = 0
+        start = time.perf_counter()
+        values.append(search([row[:] for row in b], 0, is_max, -1000, 1000, depth))
+        elapsed += time.perf_counter() - start
+        nodes += engine.analysis_count
+    return values, nodes, elapsed
+
+
+# Plain minimax with the scoring rules of minimax(): a win found at depth d scores
+# 10 - d, an immediate win is taken, a double threat counts as lost even past the
+# horizon, and a single threat must be blocked. It has no pruning, table or move
+# ordering, so it is slow but easy to trust.
+def reference_minimax(engine, b, depth, is_max, max_depth):
+    score = engine.evaluate(b)
+    if score == 10:
+        return score - depth
+    if score == -10:
+        return score + depth
+    if depth == max_depth:
+        return score
+    if not engine.remaining_moves(b):
+        return 0
+
+    mark, opponent = (engine.BOT, engine.PLAYER) if is_max else (engine.PLAYER, engine.BOT)
+    if engine.winning_cells(b, mark):
+        return 10 - (depth + 1) if is_max else -10 + (depth + 1)
+    threats = engine.winning_cells(b, opponent)
+    if len(threats) > 1:
+        return -10 + (depth + 2) if is_max else 10 - (depth + 2)
+
+    values = []
+    for i, j in threats or [(i, j) for i in range(len(b)) for j in range(len(b)) if b[i][j] == '_']:
+        b[i][j] = mark
+        values.append(reference_minimax(engine, b, depth + 1, not is_max, max_depth))
+        b[i][j] = '_'
+    return max(values) if is_max else min(values)
+
+
+# Checks the positions against reference_minimax(); returns (positions that differ,
+# positions checked) for each check
+def check(engine, positions, depth):
+    engine.LATE_MOVE_REDUCTIONS = False
+    expected = [reference_minimax(engine, [row[:] for row in b], 0, is_max, depth) for b, is_max in positions]
+    results = {}
+
+    # A warm table may answer from an entry searched deeper, which only agrees with a
+    # fresh search when neither is cut off by the horizon, so that check is limited to
+    # positions searched to the end of the game
+    solved = [index for index, (b, _) in enumerate(positions) if sum(row.count('_') for row in b) <= depth]
+
+    for name, search in (('recursive', engine.minimax), ('iterative', engine.minimax_iterative)):
+        values, _, _ = run(engine, search, positions, depth)
+        results[name] = (sum(value != want for value, want in zip(values, expected)), len(positions))
+
+        # Entries are stored relative to their node, so they must stay valid from other roots
+        engine.transposition_table.clear()
+        differ = 0
+        for index in solved:
+            b, is_max = positions[index]
+            differ += search([row[:] for row in b], 0, is_max, -1000, 1000, depth) != expected[index]
+        results[name + ', warm table'] = (differ, len(solved))
+
+    analyze_differ = threaded_differ = 0
+    for (b, is_max), want in zip(positions, expected):
+        sign = 1 if is_max else -1
+        mark = engine.BOT if is_max else engine.PLAYER
+
+        engine.transposition_table.clear()
+        for score, (i, j), _ in engine.analyze([row[:] for row in b], depth):
+            child = [row[:] for row in b]
+            child[i][j] = mark
+            if score != sign * reference_minimax(engine, child, 0, not is_max, depth):
+                analyze_differ += 1
+                break
+
+        threaded_differ += threaded.search(b, depth).value != sign * want
+    results['analyze'] = (analyze_differ, len(positions))
+    results['threaded'] = (threaded_differ, len(positions))
+    return results
+
+
+# Runs a timed search on every position; returns the depths completed and the
+# reductions and re-searches made
+def depths_in_budget(engine, positions, budget, reductions):
+    engine.LATE_MOVE_REDUCTIONS = reductions
+    engine.lmr_stats.update(reductions=0, re_searches=0)
+    depths = []
+    for b, is_max in positions:
+        engine.transposition_table.clear()
+        engine.last_score = None
+        engine.find_best_move_timed(b, budget)
+        depths.append(engine.timed_depth if engine.timed_depth is not None else -1)
+    return depths, engine.lmr_stats['reductions'], engine.lmr_stats['re_searches']
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the recursive and iterative minimax drivers")
+    parser.add_argument('--grid', type=int, default=3)
+    parser.add_argument('--depth', type=int, default=9)
+    parser.add_argument('--positions', type=int, default=50)
+    parser.add_argument('--max-plies', type=int, default=4, help="random moves played before searching")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--lmr', action='store_true', help="enable late move reductions in both drivers")
+    parser.add_argument('--budget', type=float, default=None, help="compare timed search depth with and without "
+                                                                   "late move reductions, in seconds per position")
+    parser.add_argument('--iterative', action='store_true', help="use the iterative driver for --budget")
+    parser.add_argument('--check', action='store_true', help="check values against a plain full-width minimax")
+    args = parser.parse_args()
+
+    engine = load_variant('full')
+    if engine.GRID_SIZE != args.grid:
+        engine.set_grid_size(args.grid)
+    positions = random_positions(engine, args.positions, args.max_plies, args.seed)
+
+    if args.check:
+        results = check(engine, positions, args.depth)
+        for name, (differ, checked) in results.items():
+            print(f"{name:22} {differ} of {checked} positions differ")
+        if any(differ for differ, _ in results.values()):
+            raise SystemExit("MISMATCH: the engine disagrees with the reference minimax")
+        print("All values match the reference minimax")
+        return
+
+    if args.budget is not None:
+        # Timed searches are made for the BOT, so only keep positions where it is to move
+        positions = [(b, is_max) for b, is_max in positions if is_max] or positions
+        engine.ITERATIVE_SEARCH = args.iterative
+        for reductions in (False, True):
+            depths, reduced, re_searched = depths_in_budget(engine, positions, args.budget, reductions)
+            label = "with LMR" if reductions else "no LMR"
+            print(f"{label:9} mean depth {sum(depths) / len(depths):5.2f}  min {min(depths)}  max {max(depths)}  "
+                  f"reductions {reduced}  re-searches {re_searched}")
+        return
+
+    engine.LATE_MOVE_REDUCTIONS = args.lmr
+
+    results = {}
+    for name, search in (('recursive', engine.minimax), ('iterative', engine.minimax_iterative)):
+        values, nodes, elapsed = run(engine, search, positions, args.depth)
+        results[name] = (values, nodes)
+        print(f"{name:10} {nodes:9} positions  {elapsed:7.2f}s  {nodes / elapsed:9.0f} positions/s")
+
+    if results['recursive'] != results['iterative']:
+        raise SystemExit("MISMATCH: the drivers returned different values or analysis counts")
+    print("Values and analysis counts match")
+    if args.lmr:
+        print(f"Late move reductions {engine.lmr_stats['reductions']}, re-searches {engine.lmr_stats['re_searches']} "
+              f"(both drivers)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,193 @@
+# Bulk self-play generator for position datasets.
+# Plays thousands of games in lockstep with NumPy: each batch of boards is an array
+# with one row per game, every ply picks a move for all unfinished games at once, and
+# wins are found for the whole batch by multiplying the boards by a cell-by-line matrix.
+# Every position reached is streamed to disk with the move played from it and the
+# game's final result, in fixed-size records that load straight back into NumPy.
+#
+# Moves are either uniformly random among the empty cells, or 'threats': take a win if
+# there is one, else block the opponent's win, else random.
+#
+# Record layout (19 bytes, little-endian), after a header of magic, version, grid size:
+#   x_bits, o_bits  uint64 bitmasks of the X and O cells (cell = row * size + col)
+#   move            cell played from this position
+#   ply             number of marks on the board
+#   result          +1 if the side to move went on to win, -1 if it lost, 0 for a draw
+#
+# Example: python selfplay.py --grid 3 --games 1000000 --out positions.spd
+
+import argparse
+import os
+import struct
+import time
+
+import numpy as np
+
+from bitboard import line_masks
+
+HEADER = struct.Struct('<4sHH')
+MAGIC = b'SPD1'
+VERSION = 1
+
+RECORD = np.dtype([('x_bits', '<u8'), ('o_bits', '<u8'), ('move', 'u1'), ('ply', 'u1'), ('result', 'i1')])
+
+# Cell values in the batch arrays, matching the board code digits of minimax-full.py
+EMPTY, X, O = 0, 1, 2
+
+POLICIES = ('random', 'threats')
+
+# Boards are stored as 64-bit masks
+MAX_GRID = 8
+
+
+# Returns a (cells, lines) matrix with a 1 where a cell lies on a winning line
+def line_matrix(size):
+    masks = line_masks(size)
+    matrix = np.zeros((size * size, len(masks)), dtype=np.float32)
+    for line, mask in enumerate(masks):
+        for cell in range(size * size):
+            if mask >> cell & 1:
+                matrix[cell, line] = 1
+    return matrix
+
+
+# Returns a (games, cells) mask of the empty cells that would complete a line for the
+# side whose marks are in `own`, given the opponent's marks in `other`
+def completing_cells(own, other, empty, lines, size):
+    own_counts = own @ lines
+    other_counts = other @ lines
+    open_lines = ((own_counts == size - 1) & (other_counts == 0)).astype(np.float32)
+    return (open_lines @ lines.T > 0) & empty
+
+
+# Plays one batch of games to the end. Returns (boards, moves, lengths, winners): the
+# board before every ply as a (plies, games, cells) array, the moves as (plies, games),
+# the number of plies of each game, and the winning mark of each game (EMPTY for draws).
+def play_batch(rng, games, size, policy='random'):
+    cells = size * size
+    lines = line_matrix(size)
+    boards = np.zeros((games, cells), dtype=np.int8)
+    history = np.zeros((cells, games, cells), dtype=np.int8)
+    moves = np.zeros((cells, games), dtype=np.uint8)
+    lengths = np.full(games, cells, dtype=np.int16)
+    winners = np.zeros(games, dtype=np.int8)
+    active = np.arange(games)
+
+    for ply in range(cells):
+        if not len(active):
+            break
+        mark, opponent = (X, O) if ply % 2 == 0 else (O, X)
+        b = boards[active]
+        history[ply, active] = b
+        empty = b == EMPTY
+
+        # Random scores pick a uniform empty cell; threats outrank them under that policy
+        scores = rng.random((len(active), cells), dtype=np.float32)
+        scores[~empty] = -1
+        own = (b == mark).astype(np.float32)
+        if policy == 'threats':
+            other = (b == opponent).astype(np.float32)
+            scores += 4 * completing_cells(own, other, empty, lines, size)
+            scores += 2 * completing_cells(other, own, empty, lines, size)
+        move = scores.argmax(axis=1)
+        moves[ply, active] = move
+
+        rows = np.arange(len(active))
+        b[rows, move] = mark
+        own[rows, move] = 1
+        boards[active] = b
+
+        # A game is over once the mover fills a line, or the board is full
+        won = ((own @ lines) == size).any(axis=1)
+        winners[active[won]] = mark
+        lengths[active[won]] = ply + 1
+        active = active[~won]
+
+    return history, moves, lengths, winners
+
+
+# Packs a batch's positions into records
+def batch_records(history, moves, lengths, winners, size):
+    cells = size * size
+    plies = np.arange(cells)
+    reached = plies[:, None] < lengths[None, :]
+    ply_index, game_index = np.nonzero(reached)
+    boards = history[ply_index, game_index]
+
+    powers = np.left_shift(np.uint64(1), np.arange(cells, dtype=np.uint64))
+    records = np.empty(len(ply_index), dtype=RECORD)
+    records['x_bits'] = ((boards == X).astype(np.uint64) * powers).sum(axis=1, dtype=np.uint64)
+    records['o_bits'] = ((boards == O).astype(np.uint64) * powers).sum(axis=1, dtype=np.uint64)
+    records['move'] = moves[ply_index, game_index]
+    records['ply'] = ply_index
+
+    # Results are from the point of view of the side to move at each position
+    to_move = np.where(ply_index % 2 == 0, X, O)
+    winner = winners[game_index]
+    records['result'] = np.where(winner == EMPTY, 0, np.where(winner == to_move, 1, -1))
+    return records
+
+
+# Opens a dataset for appending, writing the header if the file is new
+def open_dataset(path, size):
+    header = HEADER.pack(MAGIC, VERSION, size)
+    if os.path.exists(path) and os.path.getsize(path) > 0:
+        with open(path, 'rb') as f:
+            if f.read(HEADER.size) != header:
+                raise ValueError(f"{path} is not a {size}x{size} self-play dataset")
+        return open(path, 'ab')
+    f = open(path, 'wb')
+    f.write(header)
+    return f
+
+
+# Memory-maps a dataset; returns (grid size, records array)
+def read_positions(path):
+    with open(path, 'rb') as f:
+        magic, version, size = HEADER.unpack(f.read(HEADER.size))
+    if magic != MAGIC or version != VERSION:
+        raise ValueError(f"{path} is not a self-play dataset")
+    if os.path.getsize(path) == HEADER.size:
+        return size, np.empty(0, dtype=RECORD)
+    return size, np.memmap(path, dtype=RECORD, mode='r', offset=HEADER.size)
+
+
+# Plays `games` games in batches and appends every position to path; returns the
+# number of positions written and the X wins, O wins and draws
+def generate(path, games, size, batch=8192, policy='random', seed=None):
+    if size > MAX_GRID:
+        raise ValueError(f"boards larger than {MAX_GRID}x{MAX_GRID} do not fit the record format")
+    rng = np.random.default_rng(seed)
+    written = 0
+    outcomes = np.zeros(3, dtype=np.int64)
+    with open_dataset(path, size) as f:
+        for start in range(0, games, batch):
+            history, moves, lengths, winners = play_batch(rng, min(batch, games - start), size, policy)
+            records = batch_records(history, moves, lengths, winners, size)
+            records.tofile(f)
+            written += len(records)
+            outcomes += np.bincount(winners, minlength=3)
+    return written, outcomes[X], outcomes[O], outcomes[EMPTY]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate self-play positions with NumPy")
+    parser.add_argument('--grid', type=int, default=3)
+    parser.add_argument('--games', type=int, default=100000)
+    parser.add_argument('--batch', type=int, default=8192, help="games played in lockstep")
+    parser.add_argument('--policy', choices=POLICIES, default='random')
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--out', default='positions.spd')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    written, x_wins, o_wins, draws = generate(args.out, args.games, args.grid, args.batch, args.policy, args.seed)
+    elapsed = time.perf_counter() - start
+    print(f"{args.games} games, {written} positions in {elapsed:.2f}s "
+          f"({written / elapsed * 60 / 1e6:.1f} million positions per minute)")
+    print(f"X won {x_wins}, O won {o_wins}, drawn {draws}")
+    print(f"{args.out}: {os.path.getsize(args.out)} bytes, {RECORD.itemsize} bytes per position")
+
+
+if __name__ == "__main__":
+    main()
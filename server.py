@@ -0,0 +1,192 @@
+# Asyncio move service.
+# Serves many games at once over TCP. Each request is one line of JSON with a board and
+# a time budget, and the reply is one line of JSON with the move:
+#
+#   -> {"id": 1, "board": ["X__", "_O_", "___"], "time": 0.2}
+#   <- {"id": 1, "move": [0, 2], "nodes": 812, "latency_ms": 203.4, "queue_ms": 0.1}
+#
+# The move is for whichever side is to move (X moves first). Searches run in a process
+# pool whose workers keep their transposition tables between requests. At most
+# `workers` searches run at once, and when more than `max_queue` requests are waiting
+# new ones are answered with {"error": "busy"} straight away. {"op": "stats"} returns
+# request counts and latency percentiles.
+#
+# Example: python server.py --port 8765 --workers 4
+#          python client.py --port 8765 --clients 32 --requests 50
+
+import argparse
+import asyncio
+import collections
+import concurrent.futures
+import json
+import math
+import os
+import time
+
+from bitboard import from_board, has_won, player_to_move
+from tournament import quantile
+from ttable import CompactTable
+from variants import flip_marks, load_variant
+
+# Longest search the service will run, whatever the request asks for
+MAX_TIME = 5.0
+
+# Slots in each cached engine's transposition table, so a long-running worker's memory
+# stays fixed however many positions it sees (16 bytes per slot)
+TABLE_SLOTS = 1 << 18
+
+
+# Runs in a worker process: finds the move for the side to move on the given board.
+# Engines are cached per board size and side, so each keeps a warm table of its own.
+def search(rows, time_budget):
+    size = len(rows)
+    b = [list(row) for row in rows]
+    x_to_move = player_to_move(*from_board(rows))
+
+    engine = load_variant('full', instance=('server', size, x_to_move))
+    if engine.GRID_SIZE != size:
+        engine.set_grid_size(size)
+    if not isinstance(engine.transposition_table, CompactTable):
+        engine.use_compact_table(TABLE_SLOTS)
+    if x_to_move:
+        b = flip_marks(b, engine)
+
+    engine.analysis_count = 0
+    move = engine.find_best_move_timed(b, time_budget)
+    return list(move), engine.analysis_count
+
+
+# Loads the engine when a worker starts, so the first request does not pay for it
+def warm_up():
+    load_variant('full', instance=('server', 3, False))
+
+
+class MoveService:
+    def __init__(self, workers=None, max_queue=256):
+        self.workers = workers or os.cpu_count()
+        self.max_queue = max_queue
+        self.pool = concurrent.futures.ProcessPoolExecutor(self.workers, initializer=warm_up)
+        self.running = asyncio.Semaphore(self.workers)
+        self.waiting = 0
+        self.served = 0
+        self.rejected = 0
+        self.latencies = collections.deque(maxlen=10000)
+
+    # Validates a request's board, returning it as a list of row strings. The board must
+    # be reachable in play with the game still going: X moves first, so it has as many
+    # marks as O or one more, and nobody has completed a line.
+    @staticmethod
+    def _parse_board(board):
+        rows = [''.join(row) for row in board]
+        size = len(rows)
+        if size < 3 or any(len(row) != size or set(row) - set('XO_') for row in rows):
+            raise ValueError("board must be a square of 'X', 'O' and '_'")
+        if '_' not in ''.join(rows):
+            raise ValueError("board is full")
+        x_bits, o_bits = from_board(rows)
+        if x_bits.bit_count() - o_bits.bit_count() not in (0, 1):
+            raise ValueError("X must have as many marks as O, or one more")
+        if has_won(x_bits, size) or has_won(o_bits, size):
+            raise ValueError("game is already won")
+        return rows
+
+    async def handle_request(self, request):
+        if not isinstance(request, dict):
+            raise ValueError("request must be a JSON object")
+        if request.get('op') == 'stats':
+            return self.stats()
+
+        rows = self._parse_board(request['board'])
+        time_budget = float(request.get('time', 1.0))
+        if not (math.isfinite(time_budget) and time_budget > 0):
+            raise ValueError("time must be a positive number of seconds")
+        time_budget = min(time_budget, MAX_TIME)
+
+        # Backpressure: refuse work rather than let the queue grow without bound
+        if self.waiting >= self.max_queue:
+            self.rejected += 1
+            return {'error': 'busy'}
+
+        received = time.perf_counter()
+        self.waiting += 1
+        try:
+            await self.running.acquire()
+        finally:
+            self.waiting -= 1
+        started = time.perf_counter()
+        try:
+            loop = asyncio.get_running_loop()
+            move, nodes = await loop.run_in_executor(self.pool, search, rows, time_budget)
+        finally:
+            self.running.release()
+
+        latency = time.perf_counter() - received
+        self.latencies.append(latency)
+        self.served += 1
+        return {'move': move, 'nodes': nodes,
+                'latency_ms': round(latency * 1000, 2), 'queue_ms': round((started - received) * 1000, 2)}
+
+    def stats(self):
+        latencies = [latency * 1000 for latency in self.latencies]
+        return {'served': self.served, 'rejected': self.rejected, 'waiting': self.waiting,
+                'p50_ms': round(quantile(latencies, 0.5), 2), 'p99_ms': round(quantile(latencies, 0.99), 2)}
+
+    # Serves one connection. Requests on it are handled concurrently and replies carry the
+    # request's id, so they may arrive out of order.
+    async def handle_connection(self, reader, writer):
+        lock = asyncio.Lock()
+        tasks = set()
+
+        async def respond(line):
+            try:
+                request = json.loads(line)
+                reply = await self.handle_request(request)
+                if 'id' in request:
+                    reply['id'] = request['id']
+            except (ValueError, KeyError, TypeError) as error:
+                reply = {'error': str(error)}
+            async with lock:
+                writer.write(json.dumps(reply).encode() + b'\n')
+                await writer.drain()
+
+        try:
+            while line := await reader.readline():
+                task = asyncio.create_task(respond(line))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            await asyncio.gather(*tasks)
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    def close(self):
+        self.pool.shutdown(cancel_futures=True)
+
+
+async def serve(host, port, workers, max_queue):
+    service = MoveService(workers, max_queue)
+    server = await asyncio.start_server(service.handle_connection, host, port)
+    print(f"Serving moves on {host}:{port} with {service.workers} workers")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        service.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve engine moves over TCP")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--workers', type=int, default=None, help="search processes (default: one per core)")
+    parser.add_argument('--max-queue', type=int, default=256, help="waiting requests before replying busy")
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(args.host, args.port, args.workers, args.max_queue))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+# In-process session manager for many concurrent games.
+# Each game is stored as its base-3 board code (the same code minimax-full.py uses as a
+# table key) in an array of 64-bit integers, plus one status byte, so a game costs 9
+# bytes rather than a nested list of strings. Pending bot moves are searched in batches:
+# games sitting in the same position share one search, and results are cached so common
+# opening positions are only ever searched once.
+#
+# Example: python sessions.py --games 10000 --grid 3
+
+import argparse
+import random
+import time
+from array import array
+
+from bitboard import from_code, has_won, to_board
+from gamelog import append_game
+from variants import load_variant
+
+# Game status values
+PLAYER_TO_MOVE, BOT_TO_MOVE, PLAYER_WON, BOT_WON, DRAW, FREE = range(6)
+
+# Cell digits in board codes, matching board_code() in minimax-full.py
+PLAYER_DIGIT, BOT_DIGIT = 1, 2
+
+
+class SessionManager:
+    def __init__(self, grid_size=3, max_depth=None, cache_size=100000, log_path=None, table_slots=1 << 20):
+        self.grid_size = grid_size
+        self.cells = grid_size * grid_size
+        self.positions = array('Q')
+        self.status = bytearray()
+        self.free = []
+
+        # Weight of each cell's digit in a board code (the first cell is the most significant)
+        self.place = [3 ** (self.cells - 1 - cell) for cell in range(self.cells)]
+
+        self.engine = load_variant('full', instance=('sessions', grid_size))
+        if self.engine.GRID_SIZE != grid_size:
+            self.engine.set_grid_size(grid_size)
+
+        # A fixed-size engine table, so a long-running manager's memory stays bounded
+        self.engine.use_compact_table(table_slots)
+        self.max_depth = max_depth if max_depth is not None else self.engine.max_depth
+
+        # Bot replies by board code, shared by every game that reaches the position
+        self.cache = {}
+        self.cache_size = cache_size
+        self.searches = 0
+
+        # Move histories are only kept when finished games are logged (see gamelog.py)
+        self.log_path = log_path
+        self.histories = {} if log_path else None
+
+    def new_game(self):
+        if self.free:
+            game = self.free.pop()
+            self.positions[game] = 0
+            self.status[game] = PLAYER_TO_MOVE
+        else:
+            game = len(self.positions)
+            self.positions.append(0)
+            self.status.append(PLAYER_TO_MOVE)
+        if self.histories is not None:
+            self.histories[game] = []
+        return game
+
+    def end_game(self, game):
+        self.status[game] = FREE
+        self.free.append(game)
+        if self.histories is not None:
+            self.histories.pop(game, None)
+
+    def is_empty(self, game, cell):
+        return self.positions[game] // self.place[cell] % 3 == 0
+
+    def board(self, game):
+        return self.engine_board(self.positions[game])
+
+    def engine_board(self, code):
+        x_bits, o_bits = from_code(code, self.grid_size)
+        return to_board(x_bits, o_bits, self.grid_size, self.engine.PLAYER, self.engine.BOT)
+
+    # Places a mark and updates the game's status, logging the game if it is over
+    def _place(self, game, cell, digit, next_status, seconds=0, nodes=0):
+        if self.histories is not None:
+            mark = self.engine.PLAYER if digit == PLAYER_DIGIT else self.engine.BOT
+            self.histories[game].append((*divmod(cell, self.grid_size), mark, seconds, nodes, digit == BOT_DIGIT))
+
+        code = self.positions[game] + digit * self.place[cell]
+        self.positions[game] = code
+        x_bits, o_bits = from_code(code, self.grid_size)
+        if has_won(x_bits if digit == PLAYER_DIGIT else o_bits, self.grid_size):
+            self.status[game] = PLAYER_WON if digit == PLAYER_DIGIT else BOT_WON
+        elif (x_bits | o_bits).bit_count() == self.cells:
+            self.status[game] = DRAW
+        else:
+            self.status[game] = next_status
+
+        if self.histories is not None and self.status[game] in (PLAYER_WON, BOT_WON, DRAW):
+            winner = {PLAYER_WON: self.engine.PLAYER, BOT_WON: self.engine.BOT}.get(self.status[game])
+            append_game(self.log_path, self.grid_size, self.histories.pop(game), winner, f"full:{self.max_depth}")
+
+    # Plays the PLAYER's move; the game then waits for the next batch of bot moves
+    def play(self, game, row, col):
+        cell = row * self.grid_size + col
+        if self.status[game] != PLAYER_TO_MOVE:
+            raise ValueError(f"game {game} is not waiting for a player move")
+        if not self.is_empty(game, cell):
+            raise ValueError(f"cell {row}, {col} is already taken")
+        self._place(game, cell, PLAYER_DIGIT, BOT_TO_MOVE)
+
+    def pending(self):
+        return [game for game, status in enumerate(self.status) if status == BOT_TO_MOVE]
+
+    # Makes every pending bot move. Each distinct position is searched once per batch
+    # (or not at all if it is cached); returns (games moved, searches run).
+    def run_bot_moves(self):
+        by_position = {}
+        for game in self.pending():
+            by_position.setdefault(self.positions[game], []).append(game)
+
+        searches = 0
+        for code, games in by_position.items():
+            cell = self.cache.get(code)
+            seconds = nodes = 0
+            if cell is None:
+                self.engine.analysis_count = 0
+                start = time.perf_counter()
+                row, col = self.engine.find_best_move_with_depth_limit(self.engine_board(code), self.max_depth)
+                seconds, nodes = time.perf_counter() - start, self.engine.analysis_count
+                cell = row * self.grid_size + col
+                if len(self.cache) >= self.cache_size:
+                    self.cache.clear()
+                self.cache[code] = cell
+                searches += 1
+            for game in games:
+                self._place(game, cell, BOT_DIGIT, PLAYER_TO_MOVE, seconds, nodes)
+
+        self.searches += searches
+        return sum(len(games) for games in by_position.values()), searches
+
+    # Bytes used per game slot by the positions and status arrays
+    def bytes_per_game(self):
+        return self.positions.itemsize + 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulate many concurrent games against the bot")
+    parser.add_argument('--games', type=int, default=10000)
+    parser.add_argument('--grid', type=int, default=3)
+    parser.add_argument('--depth', type=int, default=None, help="bot search depth (default: the engine's max_depth)")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--log', default=None, help="append every finished game to this game record log")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    manager = SessionManager(args.grid, args.depth, log_path=args.log)
+    games = [manager.new_game() for _ in range(args.games)]
+
+    start = time.perf_counter()
+    moved = 0
+    while True:
+        # Every waiting player plays a random legal move
+        for game in games:
+            if manager.status[game] == PLAYER_TO_MOVE:
+                empty = [cell for cell in range(manager.cells) if manager.is_empty(game, cell)]
+                manager.play(game, *divmod(rng.choice(empty), args.grid))
+        if not manager.pending():
+            break
+        count, _ = manager.run_bot_moves()
+        moved += count
+    elapsed = time.perf_counter() - start
+
+    results = [manager.status[game] for game in games]
+    print(f"{args.games} games, {moved} bot moves from {manager.searches} searches in {elapsed:.2f}s")
+    print(f"Bot won {results.count(BOT_WON)}, player won {results.count(PLAYER_WON)}, drawn {results.count(DRAW)}")
+    print(f"{manager.bytes_per_game()} bytes per game")
+
+
+if __name__ == "__main__":
+    main()
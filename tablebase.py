@@ -0,0 +1,205 @@
+# Endgame tablebases for NxN boards.
+# Enumerates every legal, undecided position with at most k empty cells, solves them by
+# retrograde analysis (from full boards back towards emptier ones, one layer of empty
+# cells at a time), and stores the exact results in a compact file that the engine
+# memory-maps and probes instead of searching.
+#
+# Positions are stored symmetry-reduced: only the smallest board code among the eight
+# rotations and reflections is kept. Codes are the base-3 board codes of minimax-full.py.
+# Each value is a signed byte from the point of view of the side to move: +n means it
+# wins in n plies, -n that it loses in n plies, and 0 a draw.
+#
+# Example: python tablebase.py --grid 4 --max-empty 3 --out tb4.tb
+
+import argparse
+import bisect
+import itertools
+import mmap
+import struct
+import time
+from array import array
+from functools import lru_cache
+
+from bitboard import line_masks
+
+# Header: magic, grid size, max empty cells, number of positions (padded to 32 bytes)
+HEADER = struct.Struct('<4sIIQ12x')
+MAGIC = b'TTB1'
+
+# Cell digits, matching board_code() in minimax-full.py
+EMPTY, X, O = 0, 1, 2
+DIGITS = {'_': EMPTY, 'X': X, 'O': O}
+
+
+# Returns the eight symmetries of the board as cell permutations: entry i of a
+# permutation is the cell whose contents move to cell i
+@lru_cache(maxsize=None)
+def symmetries(size):
+    def rotate(perm):
+        return tuple(perm[(size - 1 - col) * size + row] for row in range(size) for col in range(size))
+
+    def flip(perm):
+        return tuple(perm[row * size + size - 1 - col] for row in range(size) for col in range(size))
+
+    perm = tuple(range(size * size))
+    perms = []
+    for _ in range(4):
+        perms.append(perm)
+        perms.append(flip(perm))
+        perm = rotate(perm)
+    return tuple(perms)
+
+
+# Returns every winning line as a tuple of cell indices
+@lru_cache(maxsize=None)
+def lines(size):
+    return tuple(tuple(cell for cell in range(size * size) if mask >> cell & 1) for mask in line_masks(size))
+
+
+# Returns the lines through each cell
+@lru_cache(maxsize=None)
+def cell_lines(size):
+    return tuple(tuple(line for line in lines(size) if cell in line) for cell in range(size * size))
+
+
+def has_winner(cells, size):
+    for line in lines(size):
+        first = cells[line[0]]
+        if first and all(cells[cell] == first for cell in line):
+            return True
+    return False
+
+
+# Returns the symmetry-reduced board code of a tuple of cell digits
+def canonical_code(cells, size):
+    best = min(tuple(cells[i] for i in perm) for perm in symmetries(size))
+    return int(''.join(map(str, best)), 3)
+
+
+# Ranks results for the side choosing a move: quick wins, then draws, then slow losses
+def rank(value):
+    if value > 0:
+        return (2, -value)
+    if value < 0:
+        return (0, -value)
+    return (1, 0)
+
+
+# Enumerates the undecided positions with exactly `empty` empty cells, as digit tuples.
+# The PLAYER ('X') moves first, so X has as many marks as O or one more.
+def positions(size, empty):
+    cells = size * size
+    marks = cells - empty
+    x_count = (marks + 1) // 2
+    for empties in itertools.combinations(range(cells), empty):
+        filled = [cell for cell in range(cells) if cell not in empties]
+        for xs in itertools.combinations(filled, x_count):
+            board = [O] * cells
+            for cell in empties:
+                board[cell] = EMPTY
+            for cell in xs:
+                board[cell] = X
+            board = tuple(board)
+            if not has_winner(board, size):
+                yield board
+
+
+# Solves every undecided position with at most max_empty empty cells.
+# Returns {canonical code: value} and prints progress per layer.
+def generate(size, max_empty, verbose=True):
+    solved = {}
+    previous = {}
+    for empty in range(1, max_empty + 1):
+        start = time.perf_counter()
+        layer = {}
+        for board in positions(size, empty):
+            code = canonical_code(board, size)
+            if code in layer:
+                continue
+
+            # The side to move is X if both sides have the same number of marks
+            mover = X if board.count(X) == board.count(O) else O
+            best = None
+            for cell in range(size * size):
+                if board[cell] != EMPTY:
+                    continue
+                child = board[:cell] + (mover,) + board[cell + 1:]
+
+                # A move that completes a line wins at once; otherwise look the reply up
+                if any(all(child[c] == mover for c in line) for line in cell_lines(size)[cell]):
+                    value = 1
+                elif empty == 1:
+                    value = 0
+                else:
+                    reply = previous[canonical_code(child, size)]
+                    value = -(reply + 1) if reply > 0 else (-reply + 1) if reply < 0 else 0
+                if best is None or rank(value) > rank(best):
+                    best = value
+            layer[code] = best
+
+        solved.update(layer)
+        previous = layer
+        if verbose:
+            print(f"{empty} empty: {len(layer)} positions in {time.perf_counter() - start:.1f}s")
+    return solved
+
+
+# Writes solved positions as a header, sorted codes ('Q') and values ('b')
+def write(path, size, max_empty, solved):
+    codes = array('Q', sorted(solved))
+    values = array('b', (solved[code] for code in codes))
+    with open(path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, size, max_empty, len(codes)))
+        codes.tofile(f)
+        values.tofile(f)
+
+
+# A memory-mapped tablebase file. probe() takes a list-of-lists board and returns the
+# value for the side to move, or None if the position is not in the table.
+class Tablebase:
+    def __init__(self, path):
+        self._file = open(path, 'rb')
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.grid_size, self.max_empty, count = HEADER.unpack_from(self._map)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a tablebase file")
+        view = memoryview(self._map)
+        self.codes = view[HEADER.size:HEADER.size + 8 * count].cast('Q')
+        self.values = view[HEADER.size + 8 * count:HEADER.size + 9 * count].cast('b')
+
+    def __len__(self):
+        return len(self.codes)
+
+    def probe_code(self, code):
+        index = bisect.bisect_left(self.codes, code)
+        if index < len(self.codes) and self.codes[index] == code:
+            return self.values[index]
+        return None
+
+    def probe(self, b):
+        cells = tuple(DIGITS[cell] for row in b for cell in row)
+        return self.probe_code(canonical_code(cells, self.grid_size))
+
+    def close(self):
+        self.codes.release()
+        self.values.release()
+        self._map.close()
+        self._file.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate an endgame tablebase")
+    parser.add_argument('--grid', type=int, default=3)
+    parser.add_argument('--max-empty', type=int, default=4, help="largest number of empty cells to solve")
+    parser.add_argument('--out', default=None, help="output file (default tb<grid>.tb)")
+    args = parser.parse_args()
+
+    path = args.out or f"tb{args.grid}.tb"
+    start = time.perf_counter()
+    solved = generate(args.grid, args.max_empty)
+    write(path, args.grid, args.max_empty, solved)
+    print(f"Wrote {len(solved)} positions ({9 * len(solved)} bytes) to {path} in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,368 @@
+# Multi-threaded alpha-beta search for free-threaded Python.
+# On CPython builds without the GIL (3.13t and later), threads can share one
+# transposition table instead of each process building its own copy. This search
+# runs on the compact boards of bitboard.py and keeps no module-level state: every
+# thread has its own node counter, and the shared table is split into stripes that
+# each have their own lock. Work is shared at split points: once the first move at a
+# node has been searched, the remaining moves are published and idle threads help
+# search them (young brothers wait). The root is just the first split point.
+#
+# On builds with the GIL, threads cannot run Python code in parallel, so the root
+# moves are split across processes instead, each with its own table.
+#
+# Scores match minimax() in minimax-full.py, seen from the side to move: a win found
+# at ply d is 10 - d and a loss is -10 + d.
+#
+# Example: python threaded.py --grid 4 --depth 16 --threads 1 2 4   (solves 4x4)
+
+import argparse
+import collections
+import multiprocessing
+import sys
+import threading
+import time
+
+from bitboard import from_board, full_mask, player_to_move, winning_cells
+from pnsearch import board_from_moves
+from ttable import EXACT, LOWER, UPPER, value_from_table, value_to_table
+from variants import load_variant
+
+WIN = 10
+INFINITY = 1000
+
+# Nodes between checks for a cutoff at an enclosing split point
+ABORT_CHECK = 1023
+
+SearchResult = collections.namedtuple('SearchResult', 'value move nodes seconds mode threads')
+
+
+# Returns True when running on a free-threaded build with the GIL disabled
+def free_threaded():
+    return hasattr(sys, '_is_gil_enabled') and not sys._is_gil_enabled()
+
+
+# A transposition table shared between threads. Keys are spread over a number of
+# dicts, each guarded by its own lock, so threads storing different positions rarely
+# wait for each other. Lookups are single dict reads and take no lock.
+class StripedTable:
+    def __init__(self, stripes=64):
+        self.stripes = [{} for _ in range(stripes)]
+        self.locks = [threading.Lock() for _ in range(stripes)]
+
+    def _stripe(self, key):
+        return (key ^ key >> 17) % len(self.stripes)
+
+    def get(self, key):
+        return self.stripes[self._stripe(key)].get(key)
+
+    # Stores an entry unless the table already has one searched deeper
+    def store(self, key, entry):
+        stripe = self._stripe(key)
+        table = self.stripes[stripe]
+        with self.locks[stripe]:
+            old = table.get(key)
+            if old is None or old[1] <= entry[1]:
+                table[key] = entry
+
+    def __len__(self):
+        return sum(len(table) for table in self.stripes)
+
+
+# Returns the empty cells as single-bit masks, the table's best move first
+def ordered_moves(free, first=None):
+    moves = []
+    if first is not None and free >> first & 1:
+        moves.append(1 << first)
+        free &= ~(1 << first)
+    while free:
+        bit = free & -free
+        moves.append(bit)
+        free ^= bit
+    return moves
+
+
+# Raised inside a search when a split point it is working for has been cut off
+class Aborted(Exception):
+    pass
+
+
+# The remaining moves of a node, searched by whichever threads pick them up
+class SplitPoint:
+    def __init__(self, parent, own, other, ply, remaining, alpha, beta, moves, best, best_move):
+        self.parent = parent
+        self.own = own
+        self.other = other
+        self.ply = ply
+        self.remaining = remaining
+        self.alpha = alpha
+        self.beta = beta
+        self.moves = moves
+        self.next = 0
+        self.best = best
+        self.best_move = best_move
+        self.cutoff = False
+        self.helpers = 0
+        self.lock = threading.Lock()
+        self.done = threading.Condition(self.lock)
+
+    # True if this split point or any enclosing one no longer needs its result
+    def aborted(self):
+        split = self
+        while split is not None:
+            if split.cutoff:
+                return True
+            split = split.parent
+        return False
+
+
+# One thread's search state
+class Searcher:
+    def __init__(self, pool):
+        self.pool = pool
+        self.nodes = 0
+        self.split = None  # Innermost split point this thread is working for
+
+    def search(self, own, other, ply, alpha, beta, remaining):
+        pool = self.pool
+        self.nodes += 1
+        if self.nodes & ABORT_CHECK == 0 and self.split is not None and self.split.aborted():
+            raise Aborted
+
+        # Return the static score at the horizon or when the board is full
+        if remaining == 0:
+            return 0
+        taken = own | other
+        if taken == pool.full:
+            return 0
+
+        # Probe the shared table
+        key = own | other << pool.cells
+        entry = pool.table.get(key)
+        tt_move = None
+        if entry is not None:
+            bound, entry_depth, value, tt_move = entry
+            if entry_depth >= remaining:
+                value = value_from_table(value, ply)
+                if bound == EXACT or (bound == LOWER and value >= beta) or (bound == UPPER and value <= alpha):
+                    return value
+
+        # Take an immediate win; lose to a double threat; only block a single threat
+        if winning_cells(own, other, pool.size):
+            return WIN - (ply + 1)
+        threats = winning_cells(other, own, pool.size)
+        if threats & (threats - 1):
+            return -WIN + (ply + 2)
+        moves = [threats] if threats else ordered_moves(pool.full & ~taken, tt_move)
+
+        alpha_orig = alpha
+        best, best_move = -INFINITY, None
+        for index, bit in enumerate(moves):
+            value = -self.search(other, own | bit, ply + 1, -beta, -alpha, remaining - 1)
+            if value > best:
+                best, best_move = value, bit
+            alpha = max(alpha, best)
+            if alpha >= beta:
+                break
+
+            # The first move has been searched; share the rest if another thread is free
+            if index == 0 and len(moves) > 1 and remaining >= pool.split_depth and pool.idle:
+                best, best_move = self.split_search(own, other, ply, alpha, beta, remaining, moves[1:],
+                                                    best, best_move)
+                break
+
+        if best <= alpha_orig:
+            bound = UPPER
+        elif best >= beta:
+            bound = LOWER
+        else:
+            bound = EXACT
+        pool.table.store(key, (bound, remaining, value_to_table(best, ply), best_move.bit_length() - 1))
+        return best
+
+    # Publishes the remaining moves of a node, works on them, and waits for the helpers
+    def split_search(self, own, other, ply, alpha, beta, remaining, moves, best, best_move):
+        split = SplitPoint(self.split, own, other, ply, remaining, alpha, beta, moves, best, best_move)
+        self.pool.publish(split)
+        self.work(split)
+        self.pool.retire(split)
+        with split.lock:
+            while split.helpers:
+                split.done.wait()
+
+        # An enclosing split point was cut off while this one was searched
+        if split.parent is not None and split.parent.aborted():
+            raise Aborted
+        return split.best, split.best_move
+
+    # Searches moves from a split point until none are left or it is cut off
+    def work(self, split):
+        enclosing, self.split = self.split, split
+        try:
+            while True:
+                with split.lock:
+                    if split.cutoff or split.next == len(split.moves):
+                        return
+                    bit = split.moves[split.next]
+                    split.next += 1
+                    alpha = split.alpha
+                try:
+                    value = -self.search(split.other, split.own | bit, split.ply + 1, -split.beta, -alpha,
+                                         split.remaining - 1)
+                except Aborted:
+                    return
+                with split.lock:
+                    if value > split.best:
+                        split.best, split.best_move = value, bit
+                    if value > split.alpha:
+                        split.alpha = value
+                    if split.alpha >= split.beta:
+                        split.cutoff = True
+        finally:
+            self.split = enclosing
+
+
+# The threads of one search and the state they share
+class ThreadPool:
+    def __init__(self, size, threads, split_depth=4, stripes=64):
+        self.size = size
+        self.cells = size * size
+        self.full = full_mask(size)
+        self.split_depth = split_depth
+        self.table = StripedTable(stripes)
+        self.splits = []
+        self.idle = 0
+        self.finished = False
+        self.lock = threading.Lock()
+        self.work_ready = threading.Condition(self.lock)
+        self.searchers = [Searcher(self) for _ in range(threads)]
+        self.threads = [threading.Thread(target=self.help, args=(searcher,), daemon=True)
+                        for searcher in self.searchers[1:]]
+
+    def publish(self, split):
+        with self.lock:
+            self.splits.append(split)
+            self.work_ready.notify_all()
+
+    def retire(self, split):
+        with self.lock:
+            self.splits.remove(split)
+
+    # Main loop of a helper thread: join the shallowest split point with moves left
+    def help(self, searcher):
+        with self.lock:
+            while not self.finished:
+                split = next((s for s in self.splits if not s.cutoff and s.next < len(s.moves)), None)
+                if split is None:
+                    self.idle += 1
+                    self.work_ready.wait()
+                    self.idle -= 1
+                    continue
+                with split.lock:
+                    split.helpers += 1
+                self.lock.release()
+                try:
+                    searcher.work(split)
+                finally:
+                    with split.lock:
+                        split.helpers -= 1
+                        split.done.notify_all()
+                    self.lock.acquire()
+
+    def run(self, own, other, remaining):
+        for thread in self.threads:
+            thread.start()
+        try:
+            value = self.searchers[0].search(own, other, 0, -INFINITY, INFINITY, remaining)
+        finally:
+            with self.lock:
+                self.finished = True
+                self.work_ready.notify_all()
+            for thread in self.threads:
+                thread.join()
+        return value
+
+    def nodes(self):
+        return sum(searcher.nodes for searcher in self.searchers)
+
+
+# Searches one root move in a separate process with its own table; used on GIL builds
+def search_root_move(task):
+    own, other, bit, size, remaining = task
+    pool = ThreadPool(size, 1)
+    searcher = pool.searchers[0]
+    value = -searcher.search(other, own | bit, 1, -INFINITY, INFINITY, remaining - 1)
+    return value, searcher.nodes
+
+
+# Returns the best move (a cell index) and the score for the side to move, searching
+# with the given number of threads. mode 'auto' uses threads on free-threaded builds
+# and processes otherwise; 'threads' and 'processes' force one or the other.
+def search(b, max_depth, threads=1, mode='auto', split_depth=4):
+    size = len(b)
+    x_bits, o_bits = from_board(b)
+    own, other = (x_bits, o_bits) if player_to_move(x_bits, o_bits) else (o_bits, x_bits)
+    free = full_mask(size) & ~(own | other)
+    if not free:
+        raise ValueError("board is full")
+    if mode == 'auto':
+        mode = 'threads' if free_threaded() or threads == 1 else 'processes'
+    start = time.perf_counter()
+
+    # An immediate win needs no search, and against a double threat any block loses
+    wins = winning_cells(own, other, size)
+    threats = winning_cells(other, own, size)
+    if wins or threats & (threats - 1):
+        bit = (wins or threats) & -(wins or threats)
+        value = WIN - 1 if wins else -WIN + 2
+        return SearchResult(value, bit.bit_length() - 1, 1, time.perf_counter() - start, mode, 1)
+
+    # At depth 0 the root is scored statically and nothing is stored, so any legal move will do
+    if max_depth == 0:
+        move = (threats or ordered_moves(free)[0]).bit_length() - 1
+        return SearchResult(0, move, 1, time.perf_counter() - start, mode, 1)
+
+    if mode == 'processes':
+        moves = [threats] if threats else ordered_moves(free)
+        tasks = [(own, other, bit, size, max_depth) for bit in moves]
+        with multiprocessing.Pool(min(threads, len(tasks))) as workers:
+            results = workers.map(search_root_move, tasks)
+        value, index = max((value, -index) for index, (value, _) in enumerate(results))
+        nodes = 1 + sum(count for _, count in results)
+        move = moves[-index].bit_length() - 1
+        return SearchResult(value, move, nodes, time.perf_counter() - start, mode, threads)
+
+    pool = ThreadPool(size, threads, split_depth)
+    value = pool.run(own, other, max_depth)
+    move = pool.table.get(own | other << pool.cells)[3]
+    return SearchResult(value, move, pool.nodes(), time.perf_counter() - start, mode, threads)
+
+
+# Searches the same position with each thread count and reports the scaling
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark threaded search scaling by thread count")
+    parser.add_argument('--grid', type=int, default=4)
+    parser.add_argument('--depth', type=int, default=16)
+    parser.add_argument('--moves', default='', help='starting moves, e.g. "1,1 0,2"')
+    parser.add_argument('--threads', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--mode', choices=['auto', 'threads', 'processes'], default='auto')
+    parser.add_argument('--split-depth', type=int, default=4, help="least remaining depth at which to share work")
+    args = parser.parse_args()
+
+    engine = load_variant('full')
+    if engine.GRID_SIZE != args.grid:
+        engine.set_grid_size(args.grid)
+    b = board_from_moves(args.moves, engine)
+
+    build = "free-threaded" if free_threaded() else "GIL"
+    print(f"{build} build, {multiprocessing.cpu_count()} CPUs, {args.grid}x{args.grid} depth {args.depth}")
+    base = None
+    for threads in args.threads:
+        result = search(b, args.depth, threads, args.mode, args.split_depth)
+        base = base or result.seconds
+        print(f"{threads:3} {result.mode:9}  move {divmod(result.move, args.grid)}  value {result.value:3}  "
+              f"{result.nodes:9} nodes  {result.seconds:7.2f}s  {result.nodes / result.seconds:9.0f} nodes/s  "
+              f"speedup {base / result.seconds:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,219 @@
+# Headless engine-vs-engine tournament.
+# Plays many games between two engine specs across a process pool and reports
+# win/draw/loss, time per move and positions analyzed per move for each side.
+#
+# An engine spec is a variant name with an optional depth or time budget:
+#   ab, table, symmetry     the fixed 3x3 scripts
+#   full:5                  minimax-full.py with max_depth 5
+#   full@0.2                minimax-full.py with 0.2 seconds per move (iterative deepening)
+#   mcts@0.5                Monte Carlo tree search with 0.5 seconds per move
+#
+# Example: python tournament.py full:9 ab --games 2000 --workers 8 --random-plies 2
+
+import argparse
+import multiprocessing
+import random
+import time
+
+import mcts
+from bitboard import from_board, has_won
+from gamelog import append_game
+from variants import flip_marks, load_variant
+
+EMPTY = '_'
+
+
+# Splits an engine spec into (variant, depth, time budget)
+def parse_spec(spec):
+    name, depth, time_budget = spec, None, None
+    if '@' in name:
+        name, budget = name.split('@', 1)
+        time_budget = float(budget)
+    if ':' in name:
+        name, limit = name.split(':', 1)
+        depth = int(limit)
+    if name == 'mcts':
+        if depth is not None or time_budget is None:
+            raise ValueError(f"{spec}: mcts needs a time budget, e.g. mcts@0.5")
+    elif (depth is not None or time_budget is not None) and name != 'full':
+        raise ValueError(f"{spec}: only the full variant supports a depth or time budget")
+    return name, depth, time_budget
+
+
+# Returns the winning mark, or None if nobody has completed a line
+def winner(board):
+    x_bits, o_bits = from_board(board)
+    if has_won(x_bits, len(board)):
+        return 'X'
+    if has_won(o_bits, len(board)):
+        return 'O'
+    return None
+
+
+# Wraps one loaded engine playing one seat
+class Engine:
+    def __init__(self, spec, seat, grid_size):
+        self.spec = spec
+        self.name, self.depth, self.time_budget = parse_spec(spec)
+
+        # MCTS works out the side to move itself and plays on any board size
+        if self.name == 'mcts':
+            self.module = mcts
+            return
+
+        # Each seat and board size gets its own module, so a side's table only ever sees its
+        # own perspective, and engines for different sizes never resize each other's board
+        self.module = load_variant(self.name, instance=(seat, grid_size))
+        if self.module.GRID_SIZE != grid_size:
+            if not hasattr(self.module, 'set_grid_size'):
+                raise ValueError(f"{spec}: this variant only plays on a {self.module.GRID_SIZE}x{self.module.GRID_SIZE} board")
+            self.module.set_grid_size(grid_size)
+
+    # Seeds the engine's choice between equal moves, if it makes one
+    def seed(self, seed):
+        if hasattr(self.module, 'seed_random'):
+            self.module.seed_random(seed)
+
+    # Returns (move, seconds, positions analyzed) for the side playing `mark`
+    def choose(self, board, mark):
+        module = self.module
+        if self.name == 'mcts':
+            start = time.perf_counter()
+            move = mcts.find_best_move(board, self.time_budget)
+            return move, time.perf_counter() - start, mcts.analysis_count
+
+        b = [row[:] for row in board] if mark == module.BOT else flip_marks(board, module)
+        module.analysis_count = 0
+        start = time.perf_counter()
+        if self.time_budget is not None:
+            move = module.find_best_move_timed(b, self.time_budget)
+        elif self.name == 'full':
+            move = module.find_best_move_with_depth_limit(b, self.depth if self.depth is not None else module.max_depth)
+        else:
+            move = module.find_best_move(b)
+        return move, time.perf_counter() - start, module.analysis_count
+
+
+# Engines are loaded once per worker process and reused for every game it plays
+_engines = {}
+
+def get_engine(spec, seat, grid_size):
+    key = (spec, seat, grid_size)
+    if key not in _engines:
+        _engines[key] = Engine(spec, seat, grid_size)
+    return _engines[key]
+
+
+# Plays one game. Engine A plays X (moving first) in even games and O in odd ones.
+# The first random_plies moves are random so that repeated games are not identical.
+def play_game(task):
+    index, spec_a, spec_b, grid_size, random_plies, seed = task
+    rng = random.Random(seed * 1000003 + index)
+
+    a_is_x = index % 2 == 0
+    seats = {'X': spec_a if a_is_x else spec_b, 'O': spec_b if a_is_x else spec_a}
+    stats = {'X': [], 'O': []}
+    board = [[EMPTY] * grid_size for _ in range(grid_size)]
+    moves = []
+    record = []  # (row, col, mark, seconds, nodes, by_engine) for the game log
+    mark = 'X'
+
+    # Seed both engines from the game's seed, so every game can be replayed exactly
+    for seat in seats:
+        get_engine(seats[seat], seat, grid_size).seed(rng.randrange(2 ** 32))
+
+    while winner(board) is None and len(moves) < grid_size * grid_size:
+        if len(moves) < random_plies:
+            empty = [(r, c) for r in range(grid_size) for c in range(grid_size) if board[r][c] == EMPTY]
+            move = rng.choice(empty)
+            seconds, nodes, by_engine = 0, 0, False
+        else:
+            move, seconds, nodes = get_engine(seats[mark], mark, grid_size).choose(board, mark)
+            stats[mark].append((seconds, nodes))
+            by_engine = True
+        board[move[0]][move[1]] = mark
+        moves.append(move)
+        record.append((move[0], move[1], mark, seconds, nodes, by_engine))
+        mark = 'O' if mark == 'X' else 'X'
+
+    won = winner(board)
+    a_mark = 'X' if a_is_x else 'O'
+    if won is None:
+        result = 'draw'
+    else:
+        result = 'win' if won == a_mark else 'loss'
+    return {
+        'index': index,
+        'a_is_x': a_is_x,
+        'result': result,
+        'a_moves': stats[a_mark],
+        'b_moves': stats['O' if a_is_x else 'X'],
+        'moves': moves,
+        'record': record,
+        'winner': won,
+        'engines': f"{seats['X']}/{seats['O']}",
+    }
+
+
+# Returns the q-th quantile of a list of numbers (nearest rank)
+def quantile(values, q):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+# Runs the whole tournament and returns the per-game results
+def run_tournament(spec_a, spec_b, games, workers=None, grid_size=3, random_plies=0, seed=0):
+    # Validate the specs up front rather than inside every worker
+    parse_spec(spec_a)
+    parse_spec(spec_b)
+
+    tasks = [(i, spec_a, spec_b, grid_size, random_plies, seed) for i in range(games)]
+    if workers == 1:
+        return [play_game(task) for task in tasks]
+    with multiprocessing.Pool(workers) as pool:
+        return list(pool.imap_unordered(play_game, tasks, chunksize=max(1, games // 64)))
+
+
+# Prints win/draw/loss and timing statistics for both engines
+def report(spec_a, spec_b, results):
+    wins = sum(r['result'] == 'win' for r in results)
+    draws = sum(r['result'] == 'draw' for r in results)
+    losses = sum(r['result'] == 'loss' for r in results)
+
+    print(f"{len(results)} games")
+    print(f"{'engine':<16}{'W':>7}{'D':>7}{'L':>7}{'avg ms':>10}{'p99 ms':>10}{'nodes/move':>12}")
+    for spec, key, w, l in ((spec_a, 'a_moves', wins, losses), (spec_b, 'b_moves', losses, wins)):
+        moves = [m for r in results for m in r[key]]
+        times = [seconds * 1000 for seconds, _ in moves]
+        nodes = [n for _, n in moves]
+        avg_ms = sum(times) / len(times) if times else 0.0
+        avg_nodes = sum(nodes) / len(nodes) if nodes else 0.0
+        print(f"{spec:<16}{w:>7}{draws:>7}{l:>7}{avg_ms:>10.2f}{quantile(times, 0.99):>10.2f}{avg_nodes:>12.0f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Play engine-vs-engine games and compare strength and speed")
+    parser.add_argument('engine_a', help="engine spec, e.g. full:9, full@0.1, mcts@0.5, ab, table, symmetry")
+    parser.add_argument('engine_b', help="engine spec for the opponent")
+    parser.add_argument('--games', type=int, default=100)
+    parser.add_argument('--workers', type=int, default=None, help="worker processes (default: one per core)")
+    parser.add_argument('--grid', type=int, default=3, help="board size (only the full variant supports more than 3)")
+    parser.add_argument('--random-plies', type=int, default=2, help="random opening moves per game")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--log', default=None, help="append every game to this game record log")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    results = run_tournament(args.engine_a, args.engine_b, args.games, args.workers,
+                             args.grid, args.random_plies, args.seed)
+    report(args.engine_a, args.engine_b, results)
+    if args.log:
+        for result in sorted(results, key=lambda r: r['index']):
+            append_game(args.log, args.grid, result['record'], result['winner'], result['engines'])
+    print(f"Finished in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
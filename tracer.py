@@ -0,0 +1,242 @@
+# Search tree tracing for minimax-full.py.
+# A Tracer writes one event per minimax() node as the search leaves it: the board code,
+# depth, alpha-beta window, returned value, whether the node cut off or was answered by
+# the transposition table, and how many positions were analyzed below it. Events are
+# streamed to disk as they happen, either as fixed-size binary records or as JSON lines.
+#
+# Nodes can be filtered by depth and sampled. Nodes at or above keep_depth are always
+# written, and each carries the size of its whole subtree, so per-subtree totals stay
+# exact however deep nodes are sampled.
+#
+# Events are written in post-order: every node's descendants come before it. That lets
+# summarize() attribute deeper events to their subtree in one streaming pass.
+#
+# Example: python tracer.py record edge.trc --moves "0,1"
+#          python tracer.py summarize edge.trc --depth 0
+
+import argparse
+import json
+import random
+import struct
+
+from bitboard import from_code, to_board
+
+# Binary trace layout: a header, then one record per node
+#   header: magic, format version, grid size, sample rate, depth sampling starts below
+#   record: board code, depth, alpha, beta, value, flags, positions analyzed below
+HEADER = struct.Struct('<4sHHdH')
+RECORD = struct.Struct('<QBbbbBI')
+MAGIC = b'TRC1'
+VERSION = 1
+
+# Window bounds beyond this are stored as unbounded
+UNBOUNDED = 127
+
+# Event flags
+IS_MAX = 1  # The BOT was to move
+CUTOFF = 2  # The value fell outside the window on the side that prunes (beta for the BOT)
+TT_HIT = 4  # The value came from the transposition table
+TT_ENTRY = 8  # The table had an entry, but it could not be used
+
+FLAG_NAMES = {IS_MAX: 'max', CUTOFF: 'cutoff', TT_HIT: 'tt_hit', TT_ENTRY: 'tt_entry'}
+
+# Writes flushed to disk once this many bytes are buffered
+BUFFER_SIZE = 1 << 20
+
+
+def clamp_bound(bound):
+    return int(max(-UNBOUNDED, min(UNBOUNDED, bound)))
+
+
+class Tracer:
+    def __init__(self, path, grid_size, binary=True, sample=1.0, max_depth=None, keep_depth=0, seed=0):
+        self.path = path
+        self.binary = binary
+        self.sample = sample
+        self.max_depth = max_depth
+        self.keep_depth = keep_depth
+        self.rng = random.Random(seed)
+        self.events = 0
+        self.buffer = bytearray()
+        self.file = open(path, 'wb' if binary else 'w')
+        if binary:
+            self.file.write(HEADER.pack(MAGIC, VERSION, grid_size, sample, keep_depth))
+        else:
+            self.file.write(json.dumps({'grid_size': grid_size, 'sample': sample, 'keep_depth': keep_depth}) + '\n')
+
+    # Records a node that analyzed `nodes` positions below it. tt_hit means its value came
+    # from the transposition table, tt_entry that the table had an entry it could not use.
+    def record(self, key, depth, is_max, alpha, beta, value, nodes, tt_hit=False, tt_entry=False):
+        if self.max_depth is not None and depth > self.max_depth:
+            return
+        if depth > self.keep_depth and self.sample < 1.0 and self.rng.random() >= self.sample:
+            return
+        self.events += 1
+
+        flags = IS_MAX if is_max else 0
+        if nodes and (value >= beta if is_max else value <= alpha):
+            flags |= CUTOFF
+        if tt_hit:
+            flags |= TT_HIT
+        if tt_entry:
+            flags |= TT_ENTRY
+
+        if self.binary:
+            self.buffer += RECORD.pack(key, depth, clamp_bound(alpha), clamp_bound(beta), value, flags,
+                                       min(nodes, 0xFFFFFFFF))
+            if len(self.buffer) >= BUFFER_SIZE:
+                self.file.write(self.buffer)
+                self.buffer.clear()
+        else:
+            event = {'key': key, 'depth': depth,
+                     'alpha': alpha if abs(alpha) < UNBOUNDED else None,
+                     'beta': beta if abs(beta) < UNBOUNDED else None,
+                     'value': value, 'nodes': nodes}
+            event.update((name, bool(flags & flag)) for flag, name in FLAG_NAMES.items())
+            self.file.write(json.dumps(event) + '\n')
+
+    def close(self):
+        if self.file.closed:
+            return
+        if self.buffer:
+            self.file.write(self.buffer)
+            self.buffer.clear()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# Returns (header, events) for a trace file in either format. Events are yielded one
+# at a time as dicts like the JSON lines, with None for unbounded window sides.
+def read_trace(path):
+    with open(path, 'rb') as f:
+        binary = f.read(len(MAGIC)) == MAGIC
+
+    if not binary:
+        with open(path) as f:
+            header = json.loads(f.readline())
+
+        def events():
+            with open(path) as f:
+                f.readline()
+                for line in f:
+                    yield json.loads(line)
+        return header, events()
+
+    with open(path, 'rb') as f:
+        magic, version, grid_size, sample, keep_depth = HEADER.unpack(f.read(HEADER.size))
+    if version != VERSION:
+        raise ValueError(f"{path}: unsupported trace version {version}")
+
+    def events():
+        with open(path, 'rb') as f:
+            f.seek(HEADER.size)
+            while chunk := f.read(RECORD.size * 4096):
+                for key, depth, alpha, beta, value, flags, nodes in RECORD.iter_unpack(chunk):
+                    event = {'key': key, 'depth': depth,
+                             'alpha': alpha if abs(alpha) < UNBOUNDED else None,
+                             'beta': beta if abs(beta) < UNBOUNDED else None,
+                             'value': value, 'nodes': nodes}
+                    event.update((name, bool(flags & flag)) for flag, name in FLAG_NAMES.items())
+                    yield event
+    return {'grid_size': grid_size, 'sample': sample, 'keep_depth': keep_depth}, events()
+
+
+# Renders a board code as rows of X, O and '.', e.g. "X..|.O.|..."
+def board_text(code, grid_size):
+    board = to_board(*from_code(code, grid_size), grid_size)
+    return '|'.join(''.join(row).replace('_', '.') for row in board)
+
+
+# Streams a trace and totals it per subtree rooted at the given depth. Returns a dict
+# by board code with the number of times the subtree was searched, the positions
+# analyzed in it (exact) and the recorded events, cutoffs and table hits below its
+# root (sampled events scaled up by the sample rate). Subtree roots must be at or
+# above the trace's keep_depth for the totals to be complete.
+def summarize(path, depth=0):
+    header, events = read_trace(path)
+    scale = 1 / header['sample']
+    subtrees = {}
+    below = [0, 0, 0]  # Events, cutoffs and table hits since the last subtree root
+
+    for event in events:
+        if event['depth'] > depth:
+            weight = scale if event['depth'] > header['keep_depth'] else 1
+            below[0] += weight
+            below[1] += weight * event['cutoff']
+            below[2] += weight * event['tt_hit']
+            continue
+        if event['depth'] == depth:
+            stats = subtrees.setdefault(event['key'], {'searches': 0, 'nodes': 0, 'events': 0, 'cutoffs': 0,
+                                                       'tt_hits': 0, 'value': None})
+            stats['searches'] += 1
+            stats['nodes'] += event['nodes']
+            stats['events'] += round(below[0])
+            stats['cutoffs'] += round(below[1])
+            stats['tt_hits'] += round(below[2])
+            stats['value'] = event['value']
+        below = [0, 0, 0]
+    return header, subtrees
+
+
+def record_search(path, grid_size, moves, depth, binary, sample, max_depth, keep_depth):
+    from pnsearch import board_from_moves
+    from variants import load_variant
+
+    engine = load_variant('full')
+    if engine.GRID_SIZE != grid_size:
+        engine.set_grid_size(grid_size)
+    b = board_from_moves(moves, engine)
+
+    with Tracer(path, grid_size, binary, sample, max_depth, keep_depth) as tracer:
+        engine.start_trace(tracer)
+        try:
+            engine.analysis_count = 0
+            move = engine.find_best_move_with_depth_limit(b, depth)
+        finally:
+            engine.stop_trace()
+    print(f"Best move {move}, {engine.analysis_count} positions analyzed, {tracer.events} events written")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Record and summarize minimax search traces")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    record = commands.add_parser('record', help="trace the BOT's search from a position")
+    record.add_argument('out')
+    record.add_argument('--grid', type=int, default=3)
+    record.add_argument('--moves', default='', help='moves played so far, e.g. "1,1 0,2"')
+    record.add_argument('--depth', type=int, default=9, help='search depth')
+    record.add_argument('--jsonl', action='store_true', help='write JSON lines instead of binary records')
+    record.add_argument('--sample', type=float, default=1.0, help='fraction of deep nodes to record')
+    record.add_argument('--max-depth', type=int, default=None, help='skip nodes deeper than this')
+    record.add_argument('--keep-depth', type=int, default=0, help='always record nodes this shallow')
+
+    summary = commands.add_parser('summarize', help='total a trace per subtree')
+    summary.add_argument('trace')
+    summary.add_argument('--depth', type=int, default=0, help='depth of the subtree roots')
+    summary.add_argument('--top', type=int, default=20, help='subtrees to list, largest first')
+    args = parser.parse_args()
+
+    if args.command == 'record':
+        record_search(args.out, args.grid, args.moves, args.depth, not args.jsonl, args.sample, args.max_depth,
+                      args.keep_depth)
+        return
+
+    header, subtrees = summarize(args.trace, args.depth)
+    total = sum(stats['nodes'] for stats in subtrees.values())
+    print(f"{len(subtrees)} subtrees at depth {args.depth}, {total} positions analyzed below them")
+    print(f"{'board':>{header['grid_size'] * (header['grid_size'] + 1) - 1}}  searches     nodes  share  "
+          f"cutoffs  tt hits  value")
+    for key, stats in sorted(subtrees.items(), key=lambda item: -item[1]['nodes'])[:args.top]:
+        print(f"{board_text(key, header['grid_size'])}  {stats['searches']:8} {stats['nodes']:9}  "
+              f"{100 * stats['nodes'] / max(1, total):4.1f}%  {stats['cutoffs']:7}  {stats['tt_hits']:7}  "
+              f"{stats['value']:5}")
+
+
+if __name__ == "__main__":
+    main()
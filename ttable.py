@@ -0,0 +1,222 @@
+# Transposition table storage for the minimax engine.
+# The default table is a plain dict, but entries can also be packed into flat arrays:
+# CompactTable keeps them in memory and MappedTable in a memory-mapped file that
+# persists between runs. All of them are keyed by the integer board code and hold
+# (bound, depth, value, move) tuples.
+#
+# Example: python ttable.py --grid 4 --depth 4   (compares dict and compact memory use)
+
+import argparse
+import atexit
+import mmap
+import os
+import struct
+import time
+import tracemalloc
+from array import array
+
+# Bound types stored with each entry
+EXACT, LOWER, UPPER = 0, 1, 2
+
+NO_MOVE = 255
+MAX_DEPTH = 255
+
+# Entries pack into two 64-bit words: the key, and the data below
+#   bits 0-15   value + 32768
+#   bits 16-17  bound
+#   bits 18-25  remaining depth
+#   bits 26-33  move (cell index, or NO_MOVE)
+WORDS_PER_ENTRY = 2
+
+# Keys are stored as key + 1 so that 0 marks an empty slot. Board codes of 6x6 and
+# smaller boards fit in 64 bits; larger ones are folded and may collide.
+KEY_MODULUS = (1 << 64) - 1
+
+# Slots examined when looking up or inserting a key (linear probing)
+PROBE_LIMIT = 8
+
+
+def pack_entry(bound, depth, value, move):
+    return ((int(value) + 32768) & 0xFFFF) | bound << 16 | min(depth, MAX_DEPTH) << 18 | \
+        (NO_MOVE if move is None else move) << 26
+
+
+def unpack_entry(data):
+    move = data >> 26 & 0xFF
+    return data >> 16 & 3, data >> 18 & 0xFF, (data & 0xFFFF) - 32768, None if move == NO_MOVE else move
+
+
+# Win and loss scores depend on the depth they were found at, so they are stored
+# relative to the node. This keeps entries valid when reached from a different root.
+def value_to_table(value, depth):
+    if value >= 1:
+        return value + depth
+    if value <= -1:
+        return value - depth
+    return value
+
+
+def value_from_table(value, depth):
+    if value >= 1:
+        return value - depth
+    if value <= -1:
+        return value + depth
+    return value
+
+
+# An open-addressing transposition table stored in a flat array of 64-bit words.
+# A key is looked for in up to PROBE_LIMIT consecutive slots from its hash. When they
+# are all taken, the entry with the least remaining depth is replaced.
+class CompactTable:
+    def __init__(self, slots=1 << 20, words=None):
+        # Round the slot count up to a power of two for the hash below
+        self.bits = max(1, (slots - 1).bit_length())
+        self.slots = 1 << self.bits
+        self.mask = self.slots - 1
+        self.words = words if words is not None else array('Q', bytes(8 * WORDS_PER_ENTRY * self.slots))
+        self.count = self.slots - list(self.words[0::WORDS_PER_ENTRY]).count(0) if words is not None else 0
+
+    # Maps a board code to its first slot (Fibonacci hashing)
+    def _slot(self, stored_key):
+        return ((stored_key * 0x9E3779B97F4A7C15) & 0xFFFFFFFFFFFFFFFF) >> (64 - self.bits)
+
+    def get(self, key, default=None):
+        stored_key = key % KEY_MODULUS + 1
+        words = self.words
+        slot = self._slot(stored_key)
+        for _ in range(PROBE_LIMIT):
+            index = slot * WORDS_PER_ENTRY
+            found = words[index]
+            if found == stored_key:
+                return unpack_entry(words[index + 1])
+            if found == 0:
+                break
+            slot = (slot + 1) & self.mask
+        return default
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    def __setitem__(self, key, entry):
+        stored_key = key % KEY_MODULUS + 1
+        words = self.words
+        slot = self._slot(stored_key)
+        victim, victim_depth = None, None
+        for _ in range(PROBE_LIMIT):
+            index = slot * WORDS_PER_ENTRY
+            found = words[index]
+            if found == stored_key or found == 0:
+                if found == 0:
+                    self.count += 1
+                words[index] = stored_key
+                words[index + 1] = pack_entry(*entry)
+                return
+            depth = words[index + 1] >> 18 & 0xFF
+            if victim is None or depth < victim_depth:
+                victim, victim_depth = index, depth
+            slot = (slot + 1) & self.mask
+
+        words[victim] = stored_key
+        words[victim + 1] = pack_entry(*entry)
+
+    def __len__(self):
+        return self.count
+
+    def clear(self):
+        self.words[:] = array('Q', bytes(8 * WORDS_PER_ENTRY * self.slots))
+        self.count = 0
+
+    def load_factor(self):
+        return self.count / self.slots
+
+    # Bytes of storage per stored entry (the whole array counts, used or not)
+    def bytes_per_entry(self):
+        return WORDS_PER_ENTRY * 8 * self.slots / max(1, self.count)
+
+
+# File layout: a fixed header followed by the same two-word slots as CompactTable
+# Header: magic, format version, grid size, number of slots
+HEADER = struct.Struct('<4sIII')
+MAGIC = b'TTT1'
+VERSION = 2
+
+
+# A CompactTable whose slots live in a memory-mapped file, so the table persists
+# between runs and probing it needs no deserialization step
+class MappedTable(CompactTable):
+    def __init__(self, path, grid_size, slots=1 << 20):
+        bits = max(1, (slots - 1).bit_length())
+        slots = 1 << bits
+        self.grid_size = grid_size
+        self.path = path
+        size = HEADER.size + slots * WORDS_PER_ENTRY * 8
+
+        # Reuse the existing file only if it was written for the same board and layout
+        header = HEADER.pack(MAGIC, VERSION, grid_size, slots)
+        reuse = False
+        if os.path.exists(path) and os.path.getsize(path) == size:
+            with open(path, 'rb') as f:
+                reuse = f.read(HEADER.size) == header
+
+        if not reuse:
+            with open(path, 'wb') as f:
+                f.write(header)
+                f.truncate(size)
+
+        self._file = open(path, 'r+b')
+        self._map = mmap.mmap(self._file.fileno(), size)
+        super().__init__(slots, memoryview(self._map)[HEADER.size:].cast('Q'))
+
+    def flush(self):
+        if not self._map.closed:
+            self._map.flush()
+
+    def close(self):
+        if not self._map.closed:
+            self._map.flush()
+            self.words.release()
+            self._map.close()
+            self._file.close()
+
+
+# Opens (or creates) a memory-mapped table and makes sure it is flushed at exit
+def open_mapped_table(path, grid_size, slots=1 << 20):
+    table = MappedTable(path, grid_size, slots)
+    atexit.register(table.close)
+    return table
+
+
+# Runs the same search with a dict and with a CompactTable and compares memory per entry
+def main():
+    from variants import load_variant
+
+    parser = argparse.ArgumentParser(description="Compare dict and compact transposition table memory use")
+    parser.add_argument('--grid', type=int, default=4)
+    parser.add_argument('--depth', type=int, default=4)
+    parser.add_argument('--slots', type=int, default=1 << 16)
+    args = parser.parse_args()
+
+    engine = load_variant('full')
+    if engine.GRID_SIZE != args.grid:
+        engine.set_grid_size(args.grid)
+    board = [['_'] * args.grid for _ in range(args.grid)]
+
+    for name in ('dict', 'compact'):
+        tracemalloc.start()
+        engine.transposition_table = {} if name == 'dict' else CompactTable(args.slots)
+        start = time.perf_counter()
+        engine.find_best_move_with_depth_limit(board, args.depth)
+        elapsed = time.perf_counter() - start
+        table = engine.transposition_table
+        used = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+
+        if name == 'dict':
+            print(f"dict:    {len(table)} entries, {used / max(1, len(table)):.0f} bytes per entry, {elapsed:.2f}s")
+        else:
+            print(f"compact: {len(table)} entries, {table.bytes_per_entry():.0f} bytes per entry "
+                  f"({WORDS_PER_ENTRY * 8} per slot), load factor {table.load_factor():.2f}, {elapsed:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,38 @@
+# Loads the minimax-*.py scripts as modules, so headless tools can drive their engines
+# without opening a pygame window. Every engine plays as BOT ('O', the maximizer).
+
+import importlib.util
+import os
+
+os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')
+
+VARIANTS = ('ab', 'table', 'symmetry', 'full')
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+_loaded = {}
+
+
+# Returns the module for minimax-<name>.py. Each instance gets its own module,
+# and so its own transposition table and counters; the same (name, instance) pair
+# always returns the same module within a process.
+def load_variant(name, instance=None):
+    if name not in VARIANTS:
+        raise ValueError(f"unknown variant {name!r}, expected one of {', '.join(VARIANTS)}")
+
+    key = (name, instance)
+    if key not in _loaded:
+        path = os.path.join(HERE, f"minimax-{name}.py")
+        spec = importlib.util.spec_from_file_location(f"minimax_{name}", path)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+
+        # main() normally initializes the counter, so set it for headless use
+        module.analysis_count = 0
+        _loaded[key] = module
+    return _loaded[key]
+
+
+# Swaps the PLAYER and BOT marks, so an engine can pick a move for the PLAYER side
+def flip_marks(b, module):
+    swap = {module.PLAYER: module.BOT, module.BOT: module.PLAYER}
+    return [[swap.get(cell, cell) for cell in row] for row in b]